@@ -31,9 +31,10 @@ class Arena:
         Args:
             obstacle (Obstacle): Obstacle to be added
         """
-        # Loop through the existing obstacles to check for duplicates
+        # Loop through the existing obstacles to check for duplicates. Obstacles compare equal by pose alone, so the id is
+        # checked as well: a second obstacle with its own id at the same pose is kept, so that its SNAP is still planned
         for ob in self.obstacles:
-            if ob == obstacle_to_add:
+            if ob == obstacle_to_add and ob.obstacle_id == obstacle_to_add.obstacle_id:
                 return
 
         self.obstacles.append(obstacle_to_add)
@@ -126,7 +127,7 @@ class Arena:
             if obstacle.direction == 8:
                 continue
             else:
-                views = [view_gridcell for view_gridcell in obstacle.get_view_gridcells(retrying) if self.is_reachable(view_gridcell.x, view_gridcell.y)]
+                views = [view_gridcell for view_gridcell in obstacle.get_view_gridcells(retrying, self.arena_width, self.arena_height) if self.is_reachable(view_gridcell.x, view_gridcell.y)]
             viewing_positions.append(views)
 
         return viewing_positions
\ No newline at end of file
@@ -1,7 +1,13 @@
 from direction import Direction
 
 class GridCell:
-    """Base class for all objects on the arena, such as cells, obstacles, etc"""
+    """Base class for all objects on the arena, such as cells, obstacles, etc
+
+    Cells compare and hash by their (x, y, direction) state, so equal states built separately share entries in the
+    PathFinder cost and path tables
+    """
+
+    __slots__ = ('x', 'y', 'direction', 'screenshot_id', 'penalty')
 
     def __init__(self, x, y, direction: Direction = Direction.NORTH, screenshot_id=-1, penalty=0):
         self.x = x
@@ -23,6 +29,22 @@ class GridCell:
         """
         return self.x == x and self.y == y and self.direction == direction
 
+    def __eq__(self, other):
+        """Checks if this cell is in the same state as input in terms of x, y, and direction
+
+        Args:
+            other (GridCell): input cell to compare to
+
+        Returns:
+            bool: True if same, False otherwise
+        """
+        if not isinstance(other, GridCell):
+            return NotImplemented
+        return self.x == other.x and self.y == other.y and self.direction == other.direction
+
+    def __hash__(self):
+        return hash((self.x, self.y, self.direction))
+
     def __repr__(self):
         return "x: {}, y: {}, d: {}, screenshot: {}".format(self.x, self.y, self.direction, self.screenshot_id)
 
@@ -1,15 +1,17 @@
 from consts import GRID_WIDTH, GRID_HEIGHT
 
-def is_valid_position(center_x: int, center_y: int):
+def is_valid_position(center_x: int, center_y: int, arena_width: int = GRID_WIDTH, arena_height: int = GRID_HEIGHT):
     """Checks if given position is within bounds
 
     Inputs
     ------
     center_x (int): x-coordinate
     center_y (int): y-coordinate
+    arena_width (int): Size of the arena in the x direction
+    arena_height (int): Size of the arena in the y direction
 
     Returns
     -------
     bool: True if valid, False otherwise
     """
-    return center_x > 0 and center_y > 0 and center_x < GRID_WIDTH - 1 and center_y < GRID_HEIGHT - 1
\ No newline at end of file
+    return center_x > 0 and center_y > 0 and center_x < arena_width - 1 and center_y < arena_height - 1
\ No newline at end of file
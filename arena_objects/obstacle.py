@@ -1,6 +1,6 @@
 from typing import List
 
-from consts import SCREENSHOT_COST, VIRTUAL_CELLS
+from consts import GRID_HEIGHT, GRID_WIDTH, SCREENSHOT_COST, VIRTUAL_CELLS
 from direction import Direction
 
 from .grid_cell import GridCell
@@ -8,25 +8,21 @@ from .helper import is_valid_position
 
 
 class Obstacle(GridCell):
-    """Obstacle class, inherited from GridCell"""
+    """Obstacle class, inherited from GridCell, compares and hashes by x, y, and direction like GridCell"""
+
+    __slots__ = ('obstacle_id',)
 
     def __init__(self, x: int, y: int, direction: Direction, obstacle_id: int):
         super().__init__(x, y, direction)
         self.obstacle_id = obstacle_id
 
-    def __eq__(self, other):
-        """Checks if this obstacle is the same as input in terms of x, y, and direction
+    def get_view_gridcells(self, retrying, arena_width: int = GRID_WIDTH, arena_height: int = GRID_HEIGHT) -> List[GridCell]:
+        """Constructs the list of GridCell from which the robot can view the symbol on the obstacle
 
         Args:
-            other (Obstacle): input obstacle to compare to
-
-        Returns:
-            bool: True if same, False otherwise
-        """
-        return self.x == other.x and self.y == other.y and self.direction == other.direction
-
-    def get_view_gridcells(self, retrying) -> List[GridCell]:
-        """Constructs the list of GridCell from which the robot can view the symbol on the obstacle
+            retrying (boolean): Whether or not the robot needs to retry
+            arena_width (int): Size of the arena in the x direction
+            arena_height (int): Size of the arena in the y direction
 
         Returns:
             List[GridCell]: Valid cell states where robot can be positioned to view the symbol on the obstacle
@@ -73,17 +69,17 @@ class Obstacle(GridCell):
             robot_direction = Direction.WEST
             
         # Center Positions
-        if is_valid_position(center_viewing_coord[0], center_viewing_coord[1]):
+        if is_valid_position(center_viewing_coord[0], center_viewing_coord[1], arena_width, arena_height):
             cells.append(GridCell(center_viewing_coord[0], center_viewing_coord[1], robot_direction, self.obstacle_id, 0))
-        if is_valid_position(close_center_viewing_coord[0], close_center_viewing_coord[1]):
+        if is_valid_position(close_center_viewing_coord[0], close_center_viewing_coord[1], arena_width, arena_height):
             cells.append(GridCell(close_center_viewing_coord[0], close_center_viewing_coord[1], robot_direction, self.obstacle_id, 0))
                 
         # Left Position
-        if is_valid_position(left_viewing_coord[0], left_viewing_coord[1]):
+        if is_valid_position(left_viewing_coord[0], left_viewing_coord[1], arena_width, arena_height):
             cells.append(GridCell(left_viewing_coord[0], left_viewing_coord[1], robot_direction, self.obstacle_id, SCREENSHOT_COST))
 
         # Right Position
-        if is_valid_position(right_viewing_coord[0], right_viewing_coord[1]):
+        if is_valid_position(right_viewing_coord[0], right_viewing_coord[1], arena_width, arena_height):
             cells.append(GridCell(right_viewing_coord[0], right_viewing_coord[1], robot_direction, self.obstacle_id, SCREENSHOT_COST))
                 
         return cells
\ No newline at end of file
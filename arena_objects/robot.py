@@ -4,6 +4,8 @@ from direction import Direction
 from .grid_cell import GridCell
 
 class Robot:
+    __slots__ = ('robot_cell',)
+
     def __init__(self, center_x: int, center_y: int, start_direction: Direction):
         """Robot object class
 
@@ -23,4 +25,14 @@ class Robot:
         Returns:
             GridCell: starting cell state of robot (x,y,d)
         """
-        return self.robot_cell[0]
\ No newline at end of file
+        return self.robot_cell[0]
+
+    def __eq__(self, other):
+        """Robots are equal by value, when their starting cell states have the same x, y, and direction"""
+        if not isinstance(other, Robot):
+            return NotImplemented
+        return self.get_robot_cell() == other.get_robot_cell()
+
+    def __hash__(self):
+        """Hashes by value, as the starting cell state does, consistently with __eq__"""
+        return hash(self.get_robot_cell())
@@ -23,9 +23,47 @@ Algorithm Constants
 ITERATIONS = 2000
 SAFE_COST = 1000 # the cost for the turn in case there is a chance that the robot is touch some obstacle
 SCREENSHOT_COST = 0 # cost for the robot to take a photo when not directly in line with the image (i.e, camera is too far left/right)
+SOLUTION_STORE_PATH = "solutions.db" # SQLite file caching solved layouts across server restarts
+PATH_WORKERS = min(4, os.cpu_count() or 1) # number of processes computing the A* searches between viewing positions, kept few as the server also runs inference
+PARALLEL_MIN_EDGES = 16 # fewer searches than this are done in-process. On the 20x20 arena a search takes 3-9ms and handing a new layout to the running workers about 20ms, so the workers only pay off from about 8 searches
+PATH_LIBRARY_DIR = "path_library" # all-pairs paths over the empty arena, generated by `python -m path_finding.path_library`
+HPA_MIN_ARENA_SIZE = 40 # arenas at least this wide or high are searched hierarchically instead of over the full lattice
+HPA_CLUSTER_SIZE = 10 # size in cells of the clusters of the hierarchical search
+HPA_HEURISTIC_WEIGHT = 1.5 # inflation of the hierarchical search heuristic, trading a little path length for far fewer expansions
+HPA_REFINE_DISTANCE = 2 # legs between clusters at most this far apart are refined when searched, longer ones only once a tour takes them
+HPA_CORRIDOR_WIDTH = 1 # clusters either side of the abstract path that the refined path may also pass through
+HPA_LONG_ENTRANCE = 6 # open stretches of a cluster border at least this long get an entrance at both ends instead of the middle
+INCREMENTAL_REBUILD_DISTANCE = 10 # shortest path trees starting this close to a changed obstacle are searched again instead of repaired
 
 '''
 Image Recognition Constants
 '''
 MODEL_ID = "sc2079_videos/7"
-CV_API_KEY = os.getenv("CV_API_KEY")
\ No newline at end of file
+CV_API_KEY = os.getenv("CV_API_KEY")
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "roboflow") # "roboflow" for the hosted model, "onnx" for local weights
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "weights/best.onnx") # exported YOLO weights used by the "onnx" backend
+ONNX_CLASS_NAMES_PATH = "weights/classes.txt" # one class name per line, only read if the model has no 'names' metadata
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0")) # threads per operator, 0 lets ONNX Runtime decide
+ONNX_INT8 = os.getenv("ONNX_INT8", "0") == "1" # run dynamically quantised int8 weights instead of float32
+INFERENCE_REPLICAS = int(os.getenv("INFERENCE_REPLICAS", "1")) # number of model replicas serving /image concurrently
+INFERENCE_QUEUE_SIZE = 4 # frames that may wait for a free replica before /image answers 503
+INFERENCE_DEADLINE = 5.0 # seconds a frame may spend queued and in inference before /image answers 504
+DETECTION_CONFIRM_CONFIDENCE = 0.8 # a detection this confident settles its obstacle, later frames of it skip inference
+QUALITY_GATE_WIDTH = 160 # frames are downscaled to this width for the pre-inference quality checks
+QUALITY_GATE_DARK = 30 # mean gray level below which a frame is rejected as underexposed
+QUALITY_GATE_BRIGHT = 225 # mean gray level above which a frame is rejected as overexposed
+QUALITY_GATE_CONTRAST = 8 # gray level standard deviation below which a frame is rejected as empty
+QUALITY_GATE_BLUR = 20 # variance of the Laplacian below which a frame is rejected as blurry
+QUALITY_GATE_DUPLICATE = 2 # mean absolute gray level difference to the obstacle's previous frame below which it is a duplicate
+INFERENCE_INPUT_SIZE = 640 # frames are cropped to their region of interest and shrunk to at most this size before inference
+# Region of the frame the symbol sits in for each SNAP signal, as (x0, y0, x1, y1) fractions of the frame
+# L/R: the obstacle is to the left/right of the robot's centre line, so the symbol appears in that half of the frame
+ROI_BANDS = {
+    'L': (0.0, 0.1, 0.65, 0.9),
+    'C': (0.175, 0.1, 0.825, 0.9),
+    'R': (0.35, 0.1, 1.0, 0.9),
+}
+IMAGE_STREAM_PORT = 5002 # TCP port of the persistent frame stream, see flask_routes/image_stream.py
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "1") == "1" # allow ?profile=1 on /path and /image, with "0" the routes are not even wrapped
+TRAFFIC_CAPTURE_DIR = os.getenv("TRAFFIC_CAPTURE_DIR") # folder to capture the requests to /path and /image in for replay.py, unset to capture nothing
+TRAFFIC_CAPTURE_QUEUE_SIZE = 256 # captured requests that may wait for the writer before new ones are dropped from the capture
@@ -1,4 +1,5 @@
 from .status import status
 from .path import path
 from .image import image
+from .image_stream import start_image_stream
 from .stitch import stitch
\ No newline at end of file
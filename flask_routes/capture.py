@@ -0,0 +1,125 @@
+"""
+Capture of the requests to /path and /image, to replay real runs against the server with replay.py in the repo root
+
+With TRAFFIC_CAPTURE_DIR set, every request to a route wrapped with captured is put on a queue, and a background thread
+appends it to <TRAFFIC_CAPTURE_DIR>/capture-<time>/traffic.jsonl, one JSON object per line:
+
+    {"seq": 12, "time": 3.25, "method": "POST", "route": "/image", "args": {}, "json": null,
+     "form": {"roi": "..."}, "file": {"field": "file", "filename": "..._3_C.jpg", "blob": "blobs/12.jpg"},
+     "status": 200, "latency": 0.084}
+
+"time" is the seconds since capture started and "latency" the seconds the route took. Uploaded files are written next
+to it under blobs/. The request thread only copies the request and queues it. If the writer falls behind, requests are
+dropped from the capture rather than slowed down, and the number dropped is kept in dropped.
+"""
+import functools
+import json
+import os
+import queue
+import threading
+import time
+
+from flask import request
+
+from consts import TRAFFIC_CAPTURE_DIR, TRAFFIC_CAPTURE_QUEUE_SIZE
+
+
+class TrafficCapture:
+    """
+    Background writer of captured requests
+    """
+    def __init__(self, capture_dir: str, queue_size: int = TRAFFIC_CAPTURE_QUEUE_SIZE):
+        """
+        Args:
+            capture_dir (str): folder to create the capture's folder in
+            queue_size (int): requests that may wait for the writer before new ones are dropped
+        """
+        self.folder = os.path.join(capture_dir, f'capture-{time.time_ns()}')
+        os.makedirs(os.path.join(self.folder, 'blobs'))
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.started = time.perf_counter()
+        self.seq = 0
+        self.seq_lock = threading.Lock()
+        self.dropped = 0
+        threading.Thread(target=self.__write, name="traffic-capture", daemon=True).start()
+
+    def record(self, entry: dict, blob: bytes = None):
+        """Queue a request for the writer, or drop it if the writer is behind
+
+        Args:
+            entry (dict): line to write, given its "seq", "time" and "file"/"blob" path here
+            blob (bytes, optional): uploaded file of the request
+        """
+        with self.seq_lock:
+            self.seq += 1
+            entry['seq'] = self.seq
+        entry['time'] = round(entry.pop('started') - self.started, 6)
+        try:
+            self.queue.put_nowait((entry, blob))
+        except queue.Full:
+            self.dropped += 1
+
+    def __write(self):
+        with open(os.path.join(self.folder, 'traffic.jsonl'), 'a') as file:
+            while True:
+                entry, blob = self.queue.get()
+                if blob is not None:
+                    extension = os.path.splitext(entry['file']['filename'])[1] or '.bin'
+                    entry['file']['blob'] = f"blobs/{entry['seq']}{extension}"
+                    with open(os.path.join(self.folder, entry['file']['blob']), 'wb') as blob_file:
+                        blob_file.write(blob)
+                file.write(json.dumps(entry) + '\n')
+                # Flushed once the queue is empty, so that a busy run is written in few larger writes
+                if self.queue.empty():
+                    file.flush()
+
+
+# Capture of this server, None unless TRAFFIC_CAPTURE_DIR is set
+traffic_capture = TrafficCapture(TRAFFIC_CAPTURE_DIR) if TRAFFIC_CAPTURE_DIR else None
+
+
+def captured(view):
+    """
+    Decorator capturing the requests to the route. Without TRAFFIC_CAPTURE_DIR, the view is returned as it is
+    """
+    if traffic_capture is None:
+        return view
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        entry = {
+            'started': time.perf_counter(),
+            'method': request.method,
+            'route': request.path,
+            # Profiling a request is not part of the traffic to replay
+            'args': {key: value for key, value in request.args.items() if key != 'profile'},
+            'json': request.get_json(silent=True),
+            'form': request.form.to_dict(),
+            'file': None,
+        }
+        blob = None
+        if request.files:
+            field, upload = next(iter(request.files.items()))
+            blob = upload.read()
+            upload.stream.seek(0)
+            entry['file'] = {'field': field, 'filename': upload.filename}
+
+        response = None
+        try:
+            response = view(*args, **kwargs)
+            return response
+        finally:
+            entry['latency'] = round(time.perf_counter() - entry['started'], 6)
+            entry['status'] = get_status_code(response)
+            traffic_capture.record(entry, blob)
+
+    return wrapper
+
+
+def get_status_code(response) -> int:
+    """Status code of what a view returned, 500 if it raised"""
+    if response is None:
+        return 500
+    if isinstance(response, tuple):
+        return response[1] if len(response) > 1 and isinstance(response[1], int) else 200
+    return getattr(response, 'status_code', 200)
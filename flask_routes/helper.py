@@ -1,8 +1,20 @@
 from PIL import Image
+from flask import Response, jsonify, request
 import glob
+import json
 import os
+import shutil
+import threading
 import time
-from direction import Direction
+
+# Each run (started by /path) keeps its raw and annotated images in its own folder under RUNS_FOLDER
+RUNS_FOLDER = 'images/runs'
+current_run_folder = None
+run_lock = threading.Lock()
+reaper_wakeup = threading.Event()
+
+# Media types a client can ask for in the Accept header to get the compact path response as MessagePack
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/vnd.msgpack', 'application/x-msgpack')
 
 
 def stitch_raw_imgs():
@@ -10,7 +22,7 @@ def stitch_raw_imgs():
     Stitches the images in the folder together and saves it into images/stitched folder
     """
     # Initialize paths
-    img_folder = 'images/raw'
+    img_folder = get_raw_img_folder()
     img_path = glob.glob(os.path.join(img_folder, "*.jpg"))
     stitch_folder = "images/stitched"
     stitch_path = os.path.join(stitch_folder, f'stitched-{int(time.time())}.jpg') 
@@ -46,7 +58,7 @@ def stitch_annotated_imgs():
     stitch_folder = 'images/stitched'
     stitch_path = os.path.join(stitch_folder, f'stitched-{int(time.time())}.jpeg')
 
-    annotated_img_folder = 'images/annotated'
+    annotated_img_folder = get_annotated_img_folder()
     annotated_path = glob.glob(os.path.join(annotated_img_folder+"/annotated_image_*.jpg"))
     annotated_timestamps = [img_path.split("_")[-1][:-4] for img_path in annotated_path]
     
@@ -66,171 +78,128 @@ def stitch_annotated_imgs():
 
     return stitch_img
 
-def clear_images():
-    for filename in os.listdir('images/raw'):
-        if filename.endswith(".jpg"):
-            file_path = os.path.join('images/raw',filename)
-            os.remove(file_path)
-
-    for filename in os.listdir('images/annotated'):
-        if filename.endswith(".jpg"):
-            file_path = os.path.join('images/annotated',filename)
-            os.remove(file_path)
-
-    # for filename in os.listdir('images/stitched'):
-    #     if filename.startswith("stitched"):
-    #         file_path = os.path.join('images/stitched',filename)
-    #         os.remove(file_path)
-
-
 def setup_img_folders():
     try:
-        os.makedirs('images/raw', exist_ok=True)
-        os.makedirs('images/annotated', exist_ok=True)
+        os.makedirs(RUNS_FOLDER, exist_ok=True)
         os.makedirs('images/stitched', exist_ok=True)
     except OSError as error:
         print(error)
 
-def get_extended_path(path):
-    extended_path = []
-    for i in range(len(path)):
-
-        extended_path.append(path[i].get_dict())
-
-        if(i+1 == len(path)): 
-            break
-
-        cur_step = path[i]
-        next_step = path[i+1]
-        if cur_step.direction == next_step.direction:
-            continue
-
-        # Add the intermediate steps for different turns
-        x_change = next_step.x - cur_step.x
-        y_change = next_step.y - cur_step.y
-        intermediate_path = []
-        if cur_step.direction == Direction.NORTH and next_step.direction == Direction.EAST:
-            #FR
-            if x_change > 0:
-                intermediate_path = [
-                    {'x':cur_step.x, 'y':cur_step.y + 1, 'd':Direction.NORTH, 's':-1},
-                    {'x':cur_step.x, 'y':cur_step.y + 2, 'd':Direction.NORTH, 's':-1},
-                    {'x':cur_step.x + 1, 'y':cur_step.y + 2, 'd':Direction.EAST, 's':-1},
-                    ]
-            #BL
-            else:
-                intermediate_path = [
-                    {'x':cur_step.x, 'y':cur_step.y - 1, 'd':Direction.NORTH, 's':-1},
-                    {'x':cur_step.x, 'y':cur_step.y - 2, 'd':Direction.NORTH, 's':-1},
-                    {'x':cur_step.x - 1, 'y':cur_step.y - 2, 'd':Direction.EAST, 's':-1},
-                    ]
-        elif cur_step.direction == Direction.NORTH and next_step.direction == Direction.WEST:
-            #FL
-            if x_change < 0:
-                intermediate_path = [
-                    {'x':cur_step.x, 'y':cur_step.y + 1, 'd':Direction.NORTH, 's':-1},
-                    {'x':cur_step.x, 'y':cur_step.y + 2, 'd':Direction.NORTH, 's':-1},
-                    {'x':cur_step.x - 1, 'y':cur_step.y + 2, 'd':Direction.WEST, 's':-1},
-                    ]
-            #BR
-            else:
-                intermediate_path = [
-                    {'x':cur_step.x, 'y':cur_step.y - 1, 'd':Direction.NORTH, 's':-1},
-                    {'x':cur_step.x, 'y':cur_step.y - 2, 'd':Direction.NORTH, 's':-1},
-                    {'x':cur_step.x + 1, 'y':cur_step.y - 2, 'd':Direction.WEST, 's':-1},
-                    ]
-        elif cur_step.direction == Direction.EAST and next_step.direction == Direction.NORTH:
-            #FL
-            if y_change > 0:
-                intermediate_path = [
-                    {'x':cur_step.x + 1, 'y':cur_step.y, 'd':Direction.EAST, 's':-1},
-                    {'x':cur_step.x + 2, 'y':cur_step.y, 'd':Direction.EAST, 's':-1},
-                    {'x':cur_step.x + 2, 'y':cur_step.y + 1, 'd':Direction.NORTH, 's':-1},
-                    ]
-            #BR
-            else:
-                intermediate_path = [
-                    {'x':cur_step.x - 1, 'y':cur_step.y, 'd':Direction.EAST, 's':-1},
-                    {'x':cur_step.x - 2, 'y':cur_step.y, 'd':Direction.EAST, 's':-1},
-                    {'x':cur_step.x - 2, 'y':cur_step.y - 1, 'd':Direction.NORTH, 's':-1},
-                    ]
-        elif cur_step.direction == Direction.EAST and next_step.direction == Direction.SOUTH:
-            #FR
-            if y_change < 0:
-                intermediate_path = [
-                    {'x':cur_step.x + 1, 'y':cur_step.y, 'd':Direction.EAST, 's':-1},
-                    {'x':cur_step.x + 2, 'y':cur_step.y, 'd':Direction.EAST, 's':-1},
-                    {'x':cur_step.x + 2, 'y':cur_step.y - 1, 'd':Direction.SOUTH, 's':-1},
-                    ]
-            #BL
-            else:
-                intermediate_path = [
-                    {'x':cur_step.x - 1, 'y':cur_step.y, 'd':Direction.EAST, 's':-1},
-                    {'x':cur_step.x - 2, 'y':cur_step.y, 'd':Direction.EAST, 's':-1},
-                    {'x':cur_step.x - 2, 'y':cur_step.y + 1, 'd':Direction.SOUTH, 's':-1},
-                    ]
-        elif cur_step.direction == Direction.WEST and next_step.direction == Direction.SOUTH:
-            #FL
-            if y_change < 0:
-                intermediate_path = [
-                    {'x':cur_step.x - 1, 'y':cur_step.y, 'd':Direction.WEST, 's':-1},
-                    {'x':cur_step.x - 2, 'y':cur_step.y, 'd':Direction.WEST, 's':-1},
-                    {'x':cur_step.x - 2, 'y':cur_step.y - 1, 'd':Direction.SOUTH, 's':-1},
-                    ]
-            #BR
-            else:
-                intermediate_path = [
-                    {'x':cur_step.x + 1, 'y':cur_step.y, 'd':Direction.WEST, 's':-1},
-                    {'x':cur_step.x + 2, 'y':cur_step.y, 'd':Direction.WEST, 's':-1},
-                    {'x':cur_step.x + 2, 'y':cur_step.y + 1, 'd':Direction.SOUTH, 's':-1},
-                    ]
-        elif cur_step.direction == Direction.WEST and next_step.direction == Direction.NORTH:
-            #FR
-            if y_change > 0:
-                intermediate_path = [
-                    {'x':cur_step.x - 1, 'y':cur_step.y, 'd':Direction.WEST, 's':-1},
-                    {'x':cur_step.x - 2, 'y':cur_step.y, 'd':Direction.WEST, 's':-1},
-                    {'x':cur_step.x - 2, 'y':cur_step.y + 1, 'd':Direction.NORTH, 's':-1},
-                    ]
-            #BL
-            else:
-                intermediate_path = [
-                    {'x':cur_step.x + 1, 'y':cur_step.y, 'd':Direction.WEST, 's':-1},
-                    {'x':cur_step.x + 2, 'y':cur_step.y, 'd':Direction.WEST, 's':-1},
-                    {'x':cur_step.x + 2, 'y':cur_step.y - 1, 'd':Direction.NORTH, 's':-1},
-                    ]
-        elif cur_step.direction == Direction.SOUTH and next_step.direction == Direction.EAST:
-            #FL
-            if x_change > 0:
-                intermediate_path = [
-                    {'x':cur_step.x, 'y':cur_step.y - 1, 'd':Direction.SOUTH, 's':-1},
-                    {'x':cur_step.x, 'y':cur_step.y - 2, 'd':Direction.SOUTH, 's':-1},
-                    {'x':cur_step.x + 1, 'y':cur_step.y - 2, 'd':Direction.EAST, 's':-1},
-                    ]
-            #BR
-            else:
-                intermediate_path = [
-                    {'x':cur_step.x, 'y':cur_step.y + 1, 'd':Direction.SOUTH, 's':-1},
-                    {'x':cur_step.x, 'y':cur_step.y + 2, 'd':Direction.SOUTH, 's':-1},
-                    {'x':cur_step.x - 1, 'y':cur_step.y + 2, 'd':Direction.EAST, 's':-1},
-                    ]
-        elif cur_step.direction == Direction.SOUTH and next_step.direction == Direction.WEST:
-            #FR
-            if x_change < 0:
-                intermediate_path = [
-                    {'x':cur_step.x, 'y':cur_step.y - 1, 'd':Direction.SOUTH, 's':-1},
-                    {'x':cur_step.x, 'y':cur_step.y - 2, 'd':Direction.SOUTH, 's':-1},
-                    {'x':cur_step.x - 1, 'y':cur_step.y - 2, 'd':Direction.WEST, 's':-1},
-                    ]
-            #BL
-            else:
-                intermediate_path = [
-                    {'x':cur_step.x, 'y':cur_step.y + 1, 'd':Direction.SOUTH, 's':-1},
-                    {'x':cur_step.x, 'y':cur_step.y + 2, 'd':Direction.SOUTH, 's':-1},
-                    {'x':cur_step.x + 1, 'y':cur_step.y + 2, 'd':Direction.WEST, 's':-1},
-                ]
-
-        for to_insert in intermediate_path:
-            extended_path.append(to_insert)
-
-    return extended_path
\ No newline at end of file
+def start_new_run():
+    """
+    Gives the new run a fresh folder for its raw and annotated images
+
+    The folders of earlier runs are only renamed here, and deleted by the reaper thread, so starting a run does not
+    depend on how many images the previous runs left on disk
+    """
+    with run_lock:
+        create_run_folder()
+
+def create_run_folder():
+    """
+    Creates the new run's folder, makes it the current one and retires every other run folder, with run_lock held so
+    that two runs starting at once cannot retire each other's folder
+    """
+    global current_run_folder
+
+    setup_img_folders()
+    run_folder = os.path.join(RUNS_FOLDER, f'run-{time.time_ns()}')
+    os.makedirs(os.path.join(run_folder, 'raw'))
+    os.makedirs(os.path.join(run_folder, 'annotated'))
+    current_run_folder = run_folder
+
+    # Retire every other run folder, including any left over from before a server restart
+    for name in os.listdir(RUNS_FOLDER):
+        old_run_folder = os.path.join(RUNS_FOLDER, name)
+        if old_run_folder != run_folder and not name.endswith('.old'):
+            try:
+                os.rename(old_run_folder, old_run_folder + '.old')
+            except OSError as error:
+                print(error)
+    reaper_wakeup.set()
+    return run_folder
+
+def get_run_folder():
+    """
+    Returns the folder of the current run, starting a run if /path has not been called yet
+    """
+    with run_lock:
+        # Checked with the lock held, so that only the first of several callers racing before any /path starts a run
+        if current_run_folder is None:
+            return create_run_folder()
+        return current_run_folder
+
+def get_raw_img_folder():
+    return os.path.join(get_run_folder(), 'raw')
+
+def get_annotated_img_folder():
+    return os.path.join(get_run_folder(), 'annotated')
+
+def get_path_format():
+    """
+    Returns the format the client asked for the path response in: "json" (the default), "compact" or "msgpack"
+
+    The format is taken from the "format" query parameter, or else from the Accept header, where a MessagePack media
+    type ranked above application/json selects "msgpack"
+    """
+    path_format = request.args.get('format')
+    if path_format is not None:
+        return path_format
+    best_match = request.accept_mimetypes.best_match(('application/json',) + MSGPACK_MIMETYPES, default='application/json')
+    return 'msgpack' if best_match in MSGPACK_MIMETYPES else 'json'
+
+def get_columnar_path(path_results):
+    """
+    Turns the list of {'x', 'y', 'd', 's'} states of the path into one integer array per key
+    """
+    return {key: [int(state[key]) for state in path_results] for key in ('x', 'y', 'd', 's')}
+
+def path_response(data, error=None, status_code=200):
+    """
+    Returns the response of a path route in the format the client asked for (see get_path_format)
+
+    "json" is the response as it has always been. "compact" and "msgpack" give the path as columnar integer arrays
+    {"x": [...], "y": [...], "d": [...], "s": [...]} instead of one object per state, encoded with orjson, or the
+    standard json module if orjson is not installed, and with MessagePack respectively
+
+    :param data: "data" of the response, None if there was an error
+    :param error: "error" of the response, None if there was none
+    :param status_code: HTTP status code of the response
+    """
+    path_format = get_path_format()
+    if path_format == 'json':
+        return jsonify({"data": data, "error": error}), status_code
+    if path_format not in ('compact', 'msgpack'):
+        return jsonify({"data": None, "error": f"Unknown format {path_format}, use json, compact or msgpack"}), 400
+
+    if data is not None:
+        data = {**data, 'path': get_columnar_path(data['path'])}
+    body = {"data": data, "error": error}
+
+    if path_format == 'msgpack':
+        try:
+            import msgpack
+        except ImportError:
+            return jsonify({"data": None, "error": "msgpack is not installed on the server"}), 406
+        return Response(msgpack.packb(body), status=status_code, mimetype='application/msgpack')
+
+    try:
+        import orjson
+        # Distances found over NumPy cost matrices are NumPy floats, which orjson only takes with this option
+        encoded = orjson.dumps(body, option=orjson.OPT_SERIALIZE_NUMPY)
+    except ImportError:
+        encoded = json.dumps(body, separators=(',', ':'))
+    return Response(encoded, status=status_code, mimetype='application/json')
+
+def reap_old_runs():
+    """
+    Reaper thread: deletes the run folders retired by start_new_run whenever it is woken up
+    """
+    while True:
+        reaper_wakeup.wait()
+        reaper_wakeup.clear()
+        for name in os.listdir(RUNS_FOLDER):
+            if name.endswith('.old'):
+                shutil.rmtree(os.path.join(RUNS_FOLDER, name), ignore_errors=True)
+
+threading.Thread(target=reap_old_runs, name="run-reaper", daemon=True).start()
@@ -2,33 +2,44 @@
 import cv2
 import supervision as sv
 from flask import Blueprint, jsonify, request
-from inference import get_roboflow_model
 
 import random
 import os
 
 
 # Local Imports
-from consts import CV_API_KEY, MODEL_ID
+from image_recognition import (DetectionAggregator, FrameQualityGate, InferenceDeadlineExceeded, InferenceExecutor,
+                               InferenceOverloaded, crop_to_roi, get_detector, get_roi, map_to_frame)
+
+from .helper import get_annotated_img_folder, get_raw_img_folder
+from .capture import captured
+from .profiling import profiled
 
 image = Blueprint('image', __name__)
 
-# Initialise model
-robomodel = get_roboflow_model(model_id= MODEL_ID, api_key=CV_API_KEY) 
+# Initialise the model replicas, kept warm and shared across requests behind a bounded queue
+inference_executor = InferenceExecutor(get_detector)
+# Results of the frames seen so far for each obstacle, reset by /path when a new run starts
+detection_aggregator = DetectionAggregator()
+# Pre-inference checks rejecting dark, flat, blurry and duplicate frames, also reset by /path
+quality_gate = FrameQualityGate()
 
 @image.route('/image', methods=['POST'])
+@captured
+@profiled
 def image_predict():
     """
     This is the main endpoint for the image prediction algorithm
 
     filename format: "<timestamp>_<obstacle_id>_<signal>.jpeg
+    optional form field "roi": "x0,y0,x1,y1" region of the frame to run the model on, derived from <signal> if absent
+    optional query parameter "profile": profile the request, see flask_routes/profiling.py
     
     :return: a json object with a key "result" and value a dictionary with keys "obstacle_id" and "image_id"
     """
     file = request.files['file']
     filename = file.filename
-    raw_img_path = 'images/raw'
-    annotated_img_path = 'images/annotated'
+    raw_img_path = get_raw_img_folder()
 
     # Error Handling for file operations
     try:
@@ -36,6 +47,7 @@ def image_predict():
         file.save(os.path.join(raw_img_path, filename))
         constituents = file.filename.split("_")
         obstacle_id = constituents[1]
+        signal = os.path.splitext(constituents[2])[0] if len(constituents) > 2 else None
 
         # Load image from the raw_img_path
         frame = cv2.imread(os.path.join(raw_img_path, filename)) 
@@ -47,21 +59,72 @@ def image_predict():
         }
         return jsonify(result)      
 
+    result, status_code = recognise_frame(frame, obstacle_id, signal, request.form.get('roi'))
+    return jsonify(result), status_code
+
+def recognise_frame(frame, obstacle_id: str, signal: str = None, roi: str = None):
+    """
+    Identify the symbol in a frame of an obstacle, shared by the /image route and the image stream
+
+    :param frame: BGR image as loaded by cv2.imread
+    :param obstacle_id: obstacle id the frame was taken of
+    :param signal: L/C/R signal of the SNAP command the frame was taken for, None if unknown
+    :param roi: "x0,y0,x1,y1" region of the frame to run the model on, derived from signal if None
+    :return: (result, status_code), result being a dictionary with keys "obstacle_id" and "image_id"
+    """
+    annotated_img_path = get_annotated_img_folder()
+
+    # Answer straight away if an earlier frame of this obstacle already identified it with high confidence
+    confirmed_id = detection_aggregator.get_confirmed(obstacle_id)
+    if confirmed_id is not None:
+        return {
+            "obstacle_id": obstacle_id,
+            "image_id": confirmed_id
+        }, 200
+
+    # Skip the model for frames it would not find anything in, answering with the obstacle's result so far if any
+    rejection = quality_gate.check(frame, obstacle_id)
+    if rejection is not None:
+        print("Frame rejected before inference:", rejection)
+        best_id = detection_aggregator.get_best(obstacle_id)
+        return {
+            "obstacle_id": obstacle_id,
+            "image_id": best_id if best_id is not None else 23,
+            "rejected": rejection
+        }, 200
+
+    # Only run the model on the part of the frame the symbol can be in, shrunk to the model's input size
+    roi = get_roi(frame.shape, signal, roi)
+    model_frame, scale = crop_to_roi(frame, roi)
+
     # Run image recognition on the image
-    results = robomodel.infer(image = frame, confidence = 0.5, iou_threshold=0.5)
-    detections = sv.Detections.from_inference(results[0].dict(by_alias=True, exclude_none=True))
+    try:
+        detections = inference_executor.detect(model_frame, confidence=0.5, iou_threshold=0.5)
+    except InferenceOverloaded as error:
+        print(error)
+        return {"obstacle_id": obstacle_id, "image_id": 23, "error": str(error)}, 503
+    except InferenceDeadlineExceeded as error:
+        print(error)
+        return {"obstacle_id": obstacle_id, "image_id": 23, "error": str(error)}, 504
+    # Only frames the model ran on count as the obstacle's previous frame for the duplicate check
+    quality_gate.remember(frame, obstacle_id)
 
     if not detections.data:
         print("Failed to detect image_id from the image")
-        return jsonify({
+        return {
             "obstacle_id": obstacle_id,
             "image_id": 23
-        })
+        }, 200
 
+    # Map the boxes back onto the full frame for annotation
+    detections = map_to_frame(detections, roi, scale)
 
     image_data = detections.data.get('class_name')
     image_data = [i for i in image_data if i != 'bullseye']
 
+    # Combine this frame with the earlier frames of the same obstacle, weighted by confidence
+    image_id = detection_aggregator.add(obstacle_id, detections.data.get('class_name'), detections.confidence)
+
     # DEBUGGING PRINT STATEMENTS
     print("Detected image:", detections.data)
 
@@ -87,6 +150,16 @@ def image_predict():
         # Return the obstacle_id and image_id
         result = {
             "obstacle_id": obstacle_id,
-            "image_id": image_data[0]
+            "image_id": image_id if image_id is not None else 23
         }
-    return jsonify(result)
\ No newline at end of file
+    return result, 200
+
+@image.route('/image/stats', methods=['GET'])
+def image_stats():
+    """
+    FLASK ROUTE: INFERENCE STATS
+    Queue depth and service time of the inference replicas, used to size INFERENCE_REPLICAS
+
+    Return: a json object with the counters from InferenceExecutor.get_stats, plus the quality gate counters
+    """
+    return jsonify({**inference_executor.get_stats(), 'quality_gate': quality_gate.get_stats()})
@@ -0,0 +1,124 @@
+"""
+Persistent TCP channel for robot frames, running next to the Flask app
+
+Each message is a length-prefixed JSON header followed by the length-prefixed JPEG bytes, lengths being 4-byte
+big-endian unsigned integers:
+
+    header: {"seq": 7, "obstacle_id": 3, "signal": "C", "roi": "x0,y0,x1,y1" (optional)}
+
+Frames of a connection are recognised concurrently, and every result is written back on the same connection as soon as
+it is ready, as a length-prefixed JSON message: the /image response plus the "seq" of the frame it answers.
+"""
+import json
+import os
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+from consts import INFERENCE_QUEUE_SIZE, INFERENCE_REPLICAS
+
+from .helper import get_raw_img_folder
+from .image import recognise_frame
+
+LENGTH = struct.Struct("!I")
+
+# Frames in flight across all connections, enough to keep the inference queue full
+stream_pool = ThreadPoolExecutor(max_workers=INFERENCE_REPLICAS + INFERENCE_QUEUE_SIZE, thread_name_prefix="image-stream")
+
+
+def read_exactly(sock, size: int):
+    """Read exactly size bytes from the socket, or return None if the connection closes first"""
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            return None
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def read_message(sock):
+    """Read one length-prefixed message from the socket, or return None if the connection closes"""
+    length = read_exactly(sock, LENGTH.size)
+    if length is None:
+        return None
+    return read_exactly(sock, LENGTH.unpack(length)[0])
+
+
+def recognise_stream_frame(header: dict, image_bytes: bytes) -> dict:
+    """Save and recognise one streamed frame, the same way /image does for an uploaded file"""
+    obstacle_id = str(header['obstacle_id'])
+    signal = header.get('signal')
+
+    # Keep the raw frame for stitching, named like the files uploaded to /image
+    filename = f"{time.time_ns()}_{obstacle_id}_{signal}.jpg"
+    with open(os.path.join(get_raw_img_folder(), filename), 'wb') as f:
+        f.write(image_bytes)
+
+    frame = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return {"obstacle_id": obstacle_id, "image_id": 23, "error": "Frame could not be decoded"}
+
+    result, _ = recognise_frame(frame, obstacle_id, signal, header.get('roi'))
+    return result
+
+
+class ImageStreamHandler(socketserver.BaseRequestHandler):
+    """Handles one robot connection, reading frames until it closes"""
+
+    def handle(self):
+        write_lock = threading.Lock()
+        # Frames submitted and not answered yet, each removing itself once its result is written
+        pending = set()
+
+        def recognise_and_send(header, image_bytes):
+            try:
+                result = recognise_stream_frame(header, image_bytes)
+            except Exception as error:
+                print("Unexpected error occured in the image stream:", error)
+                result = {"image_id": 23, "error": str(error)}
+            message = json.dumps({**result, "seq": header.get('seq')}).encode()
+            with write_lock:
+                try:
+                    self.request.sendall(LENGTH.pack(len(message)) + message)
+                except OSError:
+                    # The robot disconnected before the result was ready
+                    pass
+
+        while True:
+            header = read_message(self.request)
+            image_bytes = read_message(self.request) if header is not None else None
+            if image_bytes is None:
+                break
+
+            future = stream_pool.submit(recognise_and_send, json.loads(header), image_bytes)
+            pending.add(future)
+            future.add_done_callback(pending.discard)
+
+        # The robot has stopped sending, answer the frames still being recognised before socketserver closes the socket
+        wait(pending.copy())
+
+
+class ImageStreamServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_image_stream(host: str, port: int) -> ImageStreamServer:
+    """Start accepting robot connections on a background thread
+
+    Args:
+        host (str): address to listen on
+        port (int): port to listen on
+
+    Returns:
+        ImageStreamServer: the running server
+    """
+    server = ImageStreamServer((host, port), ImageStreamHandler)
+    threading.Thread(target=server.serve_forever, name="image-stream", daemon=True).start()
+    return server
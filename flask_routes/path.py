@@ -1,53 +1,89 @@
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, request
 
 # Local Imports
 from arena_objects import Arena, Obstacle, Robot
-from consts import ROBOT_SPEED
+from consts import GRID_HEIGHT, GRID_WIDTH, PATH_LIBRARY_DIR, ROBOT_SPEED, SOLUTION_STORE_PATH
 from direction import Direction
-from path_finding import PathFinder, command_generator
+from path_finding import PathFinder, PathLibrary, RunPlan, SolutionStore, generate_commands
 
-from .helper import clear_images, get_extended_path, setup_img_folders
+from .helper import path_response, start_new_run
+from .image import detection_aggregator, quality_gate
+from .capture import captured
+from .profiling import profiled
 
 path = Blueprint('path', __name__)
 
+# Solutions of previously seen layouts, shared across requests and server restarts
+solution_store = SolutionStore(SOLUTION_STORE_PATH)
+# Memory-mapped empty-arena paths, None until generated with `python -m path_finding.path_library`
+path_library = PathLibrary.load(PATH_LIBRARY_DIR)
+# Plan of the current run, repaired by /path/update, None until /path is called
+current_plan = None
+# Rest of the tour after a first leg, planned in the background, None unless /path was asked for the first leg only
+rest_of_tour = None
+# One tour being finished in the background, and one more in case a new run starts before it is done
+tour_planner = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tour-planner")
+
 @path.route('/path', methods=['POST'])
+@captured
+@profiled
 def path_finder():
     """
     FLASK ROUTE: PATH FINDER
     This is the main endpoint for the path finding algorithm
 
-    Return: a json object with a key "data" and value a dictionary with keys "distance", "path", and "commands"
+    With ?profile=1, the request is profiled and the response has a "profile_id" (see flask_routes/profiling.py).
+
+    With "first_leg": true in the request, only the commands up to the first SNAP are returned, with "complete": false,
+    so that the robot can set off straight away. The rest of the tour is planned in the background and fetched from
+    /path/rest while the robot drives the first leg.
+
+    Return: a json object with a key "data" and value a dictionary with keys "distance", "path", and "commands", or
+            the compact form of it asked for with ?format=compact, ?format=msgpack or the Accept header (see
+            path_response)
     """
     # Get the json data from the request
     content = request.json
+    first_leg = content.get('first_leg', False)
 
     # Get the obstacles, big_turn, retrying, robot_x, robot_y, and robot_direction from the json data
     obstacles = content['obstacles']
     retrying = content['retrying']
     robot_x, robot_y = content['robot_x'], content['robot_y']
     robot_direction = int(content['robot_dir'])   
+    # Arena size is optional, defaulting to the competition arena
+    arena_width = int(content.get('arena_width', GRID_WIDTH))
+    arena_height = int(content.get('arena_height', GRID_HEIGHT))
 
     # Initialize the Arena, Robot and Obstacles
     robot = Robot(robot_x, robot_y, robot_direction)
-    arena = Arena(arena_height=20, arena_width=20, robot=robot)
+    arena = Arena(arena_height=arena_height, arena_width=arena_width, robot=robot)
     for ob in obstacles:
         obstacle_to_add = Obstacle(ob['x'], ob['y'], ob['d'], ob['id'])
         arena.add_obstacle(obstacle_to_add)
 
-    # Creates the PathFinder object
-    path_finder = PathFinder(arena, big_turn=None)
-
-    # Get shortest path
+    # Get shortest path, reusing the stored solution if this layout (or a rotation/reflection of it) was solved before
     search_start_time = time.perf_counter()
-    optimal_path, total_distance = path_finder.get_shortest_path(retrying=retrying)
+    cached_solution = solution_store.lookup(arena, retrying)
+    if cached_solution is not None:
+        optimal_path, total_distance = cached_solution
+    elif first_leg:
+        # Legs are read off incremental search trees, far quicker to build than searching every leg with A*
+        path_finder = PathFinder(arena, big_turn=None, path_library=path_library, incremental=True)
+        optimal_path, total_distance = path_finder.get_first_leg(retrying)
+    else:
+        # Creates the PathFinder object
+        path_finder = PathFinder(arena, big_turn=None, path_library=path_library)
+        optimal_path, total_distance = path_finder.get_shortest_path(retrying=retrying)
+        solution_store.save(arena, retrying, optimal_path, total_distance)
     search_end_time = time.perf_counter()
 
     # Based on the shortest path, generate commands for the robot
-    commands = command_generator(optimal_path, obstacles)
-
-    path_results = get_extended_path(optimal_path)
+    commands, path_results = generate_commands(optimal_path, obstacles)
     
     # SHORTEST PATH SEARCH INFO
     # print(f"Time taken to find shortest path using A* search: {search_end_time - search_start_time:0.3f}s")
@@ -71,16 +107,116 @@ def path_finder():
     #     else:
     #         print(command, end=" ")
 
-    # Initialise folders to prepare for SNAP commands
-    setup_img_folders()
-    clear_images()
-        
-    return jsonify({
-        "data": {
-            'distance': total_distance,
-            'path': path_results,
-            'commands': commands,
-            'duration': total_distance / ROBOT_SPEED
-        },
-        "error": None
-    })
\ No newline at end of file
+    # Give the run fresh folders to prepare for SNAP commands, the previous run's images are removed in the background
+    start_new_run()
+    detection_aggregator.reset()
+    quality_gate.reset()
+
+    # Keep the plan for /path/update, searching its legs in the background so that an update only has to repair them
+    global current_plan, rest_of_tour
+    current_plan = RunPlan(arena, obstacles, retrying, optimal_path)
+    complete = cached_solution is not None or not first_leg or not optimal_path
+    if complete:
+        rest_of_tour = None
+        threading.Thread(target=current_plan.prepare, name="plan-prepare", daemon=True).start()
+    else:
+        # The first leg ends with its SNAP, the robot stops for FIN at the end of the rest of the tour instead
+        commands = commands[:-1]
+        rest_of_tour = tour_planner.submit(finish_tour, current_plan, path_finder, retrying, optimal_path, obstacles)
+
+    data = {
+        'distance': total_distance,
+        'path': path_results,
+        'commands': commands,
+        'duration': total_distance / ROBOT_SPEED
+    }
+    if first_leg:
+        data['complete'] = complete
+    return path_response(data)
+
+@path.route('/path/rest', methods=['GET'])
+def path_rest():
+    """
+    FLASK ROUTE: REST OF TOUR
+    Rest of the tour after the first leg returned by /path, planned in the background while the robot drives it
+
+    Query parameters: wait (optional): seconds to wait for the rest of the tour if it is not ready yet, 0 by default
+
+    Return: a json object like the one of /path, for the tour from the end of the first leg, or a 202 with "data" null
+    while it is still being planned
+    """
+    future = rest_of_tour
+    if future is None:
+        return path_response(None, "No tour being planned, call /path with first_leg first", 400)
+
+    try:
+        data = future.result(timeout=float(request.args.get('wait', 0)))
+    except TimeoutError:
+        return path_response(None, "Rest of the tour is still being planned", 202)
+    return path_response(data)
+
+def finish_tour(plan: RunPlan, path_finder: PathFinder, retrying: bool, first_leg: list, obstacles: list) -> dict:
+    """
+    Plan the rest of the tour from the end of the first leg, leaving out the obstacle it photographs
+
+    :param plan: plan of the run, given the whole tour once it is known
+    :param path_finder: PathFinder the first leg was picked with, whose legs are reused
+    :param retrying: whether or not the robot needs to retry
+    :param first_leg: path of the first leg
+    :param obstacles: obstacles of the run, each a dictionary with keys "x", "y", "d", and "id"
+    :return: the "data" of the /path/rest response
+    """
+    end = first_leg[-1]
+    path_finder.update_arena(Robot(end.x, end.y, end.direction), path_finder.arena.get_obstacles())
+    view_positions = [
+        views for views in path_finder.arena.get_viewing_positions(retrying)
+        if not views or views[0].screenshot_id != end.screenshot_id
+    ]
+    rest_path, rest_distance = path_finder.get_shortest_path(retrying, view_positions)
+    # Nothing left to photograph, or nothing reachable
+    if not rest_path:
+        rest_path, rest_distance = [path_finder.robot.get_robot_cell()], 0
+
+    plan.complete(first_leg + rest_path[1:])
+    threading.Thread(target=plan.prepare, name="plan-prepare", daemon=True).start()
+    rest_commands, rest_results = generate_commands(rest_path, obstacles)
+    return {
+        'distance': rest_distance,
+        # The first leg already ends in the rest's start state
+        'path': rest_results[1:],
+        'commands': rest_commands,
+        'duration': rest_distance / ROBOT_SPEED
+    }
+
+@path.route('/path/update', methods=['POST'])
+def path_update():
+    """
+    FLASK ROUTE: PATH UPDATE
+    Repairs the plan of the current run when obstacles turn out to be missing, misplaced or unexpected partway through,
+    repairing the searched legs instead of planning from scratch
+
+    JSON fields: robot_x, robot_y, robot_dir: the robot's current state, which the new plan starts from
+                 obstacles (optional): obstacles to add, or to move if their id is already in the plan
+                 remove (optional): ids of the obstacles to remove
+                 visited (optional): ids of the obstacles already photographed, left out of the new plan
+
+    Return: a json object like the one of /path, for the obstacles left to photograph
+    """
+    plan = current_plan
+    if plan is None:
+        return path_response(None, "No plan to update, call /path first", 400)
+
+    content = request.json
+    robot = Robot(content['robot_x'], content['robot_y'], int(content['robot_dir']))
+
+    optimal_path, total_distance, obstacles = plan.update(
+        robot, content.get('obstacles', []), content.get('remove', []), content.get('visited', [])
+    )
+    commands, path_results = generate_commands(optimal_path, obstacles)
+
+    return path_response({
+        'distance': total_distance,
+        'path': path_results,
+        'commands': commands,
+        'duration': total_distance / ROBOT_SPEED
+    })
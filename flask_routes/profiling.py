@@ -0,0 +1,117 @@
+"""
+Opt-in profiling of single requests, to find out why one layout or one frame was slow in the field
+
+A request to a route wrapped with profiled, with ?profile=1 or an "X-Profile: 1" header, is handled under cProfile.
+Two files are saved in PROFILES_FOLDER/<run>, named after the current run's folder but kept apart from it so that
+they are not deleted with the run's images when the next run starts:
+
+    <profile_id>.prof     pstats dump, for `python -m pstats` or snakeviz
+    <profile_id>.folded   collapsed stacks in microseconds, for flamegraph.pl or speedscope
+
+The id is returned in the "X-Profile-Id" header, and as "profile_id" in JSON responses. cProfile only sees the thread
+handling the request: the A* searches farmed out to worker processes and the model running on an inference replica
+show up as time spent waiting for them.
+"""
+import cProfile
+import functools
+import os
+import pstats
+import threading
+import time
+from collections import Counter
+
+from flask import json, make_response, request
+
+from consts import REQUEST_PROFILING
+
+from .helper import get_run_folder
+
+PROFILES_FOLDER = 'profiles'
+# cProfile cannot profile two threads at once on every Python version, so profiled requests are handled one at a time
+profile_lock = threading.Lock()
+
+
+def get_profile_folder():
+    return os.path.join(PROFILES_FOLDER, os.path.basename(get_run_folder()))
+
+def is_profile_requested():
+    return request.args.get('profile', request.headers.get('X-Profile', '0')) not in ('', '0', 'false')
+
+def profiled(view):
+    """
+    Decorator letting a client ask for the route to be profiled. With REQUEST_PROFILING off, the view is returned as it
+    is, and otherwise requests that do not ask for a profile only pay for looking up the query parameter and header
+    """
+    if not REQUEST_PROFILING:
+        return view
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_profile_requested():
+            return view(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        with profile_lock:
+            response = make_response(profiler.runcall(view, *args, **kwargs))
+
+        # Saved after the view ran, so that the profile of /path goes to the run it started
+        profile_id = f'{request.endpoint.split(".")[-1]}-{time.time_ns()}'
+        save_profile(profiler, profile_id)
+        response.headers['X-Profile-Id'] = profile_id
+        if response.is_json and isinstance(response.get_json(silent=True), dict):
+            response.set_data(json.dumps({**response.get_json(), 'profile_id': profile_id}))
+        return response
+
+    return wrapper
+
+def save_profile(profiler: cProfile.Profile, profile_id: str):
+    """
+    Saves the profile as a pstats dump and as collapsed stacks in the profile folder of the current run
+
+    :param profiler: profiler the request was handled under
+    :param profile_id: name of the files, without extension
+    """
+    profile_folder = get_profile_folder()
+    os.makedirs(profile_folder, exist_ok=True)
+    stats = pstats.Stats(profiler)
+    stats.dump_stats(os.path.join(profile_folder, f'{profile_id}.prof'))
+    with open(os.path.join(profile_folder, f'{profile_id}.folded'), 'w') as file:
+        for stack, microseconds in sorted(get_collapsed_stacks(stats).items()):
+            file.write(f'{stack} {microseconds}\n')
+
+def get_collapsed_stacks(stats: pstats.Stats) -> Counter:
+    """
+    Rebuilds collapsed stacks from the call graph of a deterministic profile
+
+    cProfile only records how long each function ran when called from each caller, not the full stacks. A function's
+    own time is split between the stacks leading to it in proportion to the time it spent called from each caller, as
+    flame graphs of cProfile output usually are. Recursive calls are folded into the outermost call.
+
+    :param stats: profile to rebuild the stacks of
+    :return: microseconds of own time of each stack, keyed by its frames joined with ";" from the outermost
+    """
+    callees = {func: [] for func in stats.stats}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, edge_time) in callers.items():
+            callees[caller].append((func, edge_time))
+
+    stacks = Counter()
+
+    def walk(func, frames, seen, fraction):
+        own_time = stats.stats[func][2]
+        filename, line, name = func
+        frames = frames + (f'{name} ({os.path.basename(filename)}:{line})' if line else name,)
+        microseconds = round(own_time * fraction * 1e6)
+        if microseconds:
+            stacks[';'.join(frames)] += microseconds
+        for callee, edge_time in callees[func]:
+            callee_time = stats.stats[callee][3]
+            # Skip recursion and branches too short to show up in the flame graph
+            if callee in seen or not callee_time or edge_time * fraction < 1e-6:
+                continue
+            walk(callee, frames, seen | {callee}, fraction * edge_time / callee_time)
+
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        if not callers:
+            walk(func, (), {func}, 1.0)
+    return stacks
@@ -1,5 +1,5 @@
 from flask import Blueprint, jsonify
-from .helper import clear_images, setup_img_folders, get_extended_path
+from .helper import setup_img_folders
 
 
 status = Blueprint('status', __name__)
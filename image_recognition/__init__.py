@@ -0,0 +1,5 @@
+from .detector import OnnxDetector, RoboflowDetector, get_detector
+from .executor import InferenceDeadlineExceeded, InferenceExecutor, InferenceOverloaded
+from .aggregator import DetectionAggregator
+from .quality_gate import FrameQualityGate
+from .roi import crop_to_roi, get_roi, map_to_frame
@@ -0,0 +1,70 @@
+import threading
+from collections import defaultdict
+from typing import Optional
+
+from consts import DETECTION_CONFIRM_CONFIDENCE
+
+
+class DetectionAggregator:
+    """
+    Per-obstacle detection results for the current run
+
+    The robot sends several frames per obstacle (SNAP<id>_L/_C/_R). Once one of them gives a non-bullseye class with
+    at least DETECTION_CONFIRM_CONFIDENCE, the obstacle is confirmed and later frames need no inference. Until then,
+    every frame's detections vote for their class with their confidence.
+    """
+    def __init__(self, confirm_confidence: float = DETECTION_CONFIRM_CONFIDENCE):
+        """
+        Args:
+            confirm_confidence (float): confidence at which a single detection settles the obstacle's class
+        """
+        self.confirm_confidence = confirm_confidence
+        self.lock = threading.Lock()
+        self.confirmed = dict()
+        self.votes = defaultdict(lambda: defaultdict(float))
+
+    def reset(self):
+        """Forget all obstacles, called when a new run is planned"""
+        with self.lock:
+            self.confirmed.clear()
+            self.votes.clear()
+
+    def get_confirmed(self, obstacle_id: str) -> Optional[str]:
+        """Returns the confirmed class of the obstacle, or None if no frame has confirmed it yet"""
+        with self.lock:
+            return self.confirmed.get(obstacle_id)
+
+    def get_best(self, obstacle_id: str) -> Optional[str]:
+        """Returns the obstacle's class given its frames so far, or None if no frame had a non-bullseye detection"""
+        with self.lock:
+            return self.__get_best(obstacle_id)
+
+    def __get_best(self, obstacle_id: str) -> Optional[str]:
+        if obstacle_id in self.confirmed:
+            return self.confirmed[obstacle_id]
+        votes = self.votes.get(obstacle_id)
+        if not votes:
+            return None
+        return max(votes, key=votes.get)
+
+    def add(self, obstacle_id: str, class_names, confidences) -> Optional[str]:
+        """Add the detections of one frame of the obstacle
+
+        Args:
+            obstacle_id (str): obstacle id taken from the frame's filename
+            class_names (List[str]): class name of each detection
+            confidences (List[float]): confidence of each detection
+
+        Returns:
+            str: the obstacle's class given all its frames so far, or None if no frame had a non-bullseye detection
+        """
+        with self.lock:
+            votes = self.votes[obstacle_id]
+            for class_name, confidence in zip(class_names, confidences):
+                if class_name == 'bullseye':
+                    continue
+                votes[class_name] += float(confidence)
+                if confidence >= self.confirm_confidence and obstacle_id not in self.confirmed:
+                    self.confirmed[obstacle_id] = class_name
+
+            return self.__get_best(obstacle_id)
@@ -0,0 +1,152 @@
+import ast
+import os
+
+import cv2
+import numpy as np
+import supervision as sv
+
+from consts import (CV_API_KEY, DETECTOR_BACKEND, MODEL_ID, ONNX_CLASS_NAMES_PATH, ONNX_INT8, ONNX_INTRA_OP_THREADS,
+                    ONNX_MODEL_PATH)
+
+
+class RoboflowDetector:
+    """Detector backed by the hosted Roboflow model, downloaded with the API key on startup"""
+
+    def __init__(self, model_id: str = MODEL_ID, api_key: str = CV_API_KEY):
+        from inference import get_roboflow_model
+
+        self.model = get_roboflow_model(model_id=model_id, api_key=api_key)
+
+    def detect(self, frame: np.ndarray, confidence: float, iou_threshold: float) -> sv.Detections:
+        """Run the model on a BGR frame
+
+        Args:
+            frame (np.ndarray): BGR image as loaded by cv2.imread
+            confidence (float): minimum confidence of a detection
+            iou_threshold (float): IoU above which overlapping detections are suppressed
+
+        Returns:
+            sv.Detections: detections with a 'class_name' data field
+        """
+        results = self.model.infer(image=frame, confidence=confidence, iou_threshold=iou_threshold)
+        return sv.Detections.from_inference(results[0].dict(by_alias=True, exclude_none=True))
+
+
+class OnnxDetector:
+    """
+    Detector running exported YOLO weights from a local path on an ONNX Runtime CPU session
+
+    The session is created (and warmed up) once and reused across requests. With int8 enabled, the weights are
+    dynamically quantised next to the original model on first use and the quantised copy is loaded instead.
+    """
+
+    def __init__(self, model_path: str = ONNX_MODEL_PATH, intra_op_threads: int = ONNX_INTRA_OP_THREADS,
+                 int8: bool = ONNX_INT8, class_names_path: str = ONNX_CLASS_NAMES_PATH):
+        """
+        Args:
+            model_path (str): Path of the exported .onnx model
+            intra_op_threads (int): Number of threads used within each operator, 0 lets ONNX Runtime decide
+            int8 (bool): Whether to run int8 quantised weights
+            class_names_path (str): Text file with one class name per line, used if the model has no 'names' metadata
+        """
+        import onnxruntime as ort
+
+        if int8:
+            model_path = self.__quantise(model_path)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_height, self.input_width = model_input.shape[2], model_input.shape[3]
+        self.class_names = self.__load_class_names(class_names_path)
+
+        # Warm up the session so the first request does not pay for memory allocation and kernel selection
+        self.session.run(None, {self.input_name: np.zeros((1, 3, self.input_height, self.input_width), dtype=np.float32)})
+
+    def __quantise(self, model_path: str) -> str:
+        """Returns the path of the int8 copy of the model, quantising it if it does not exist yet"""
+        quantised_path = os.path.splitext(model_path)[0] + ".int8.onnx"
+        if not os.path.exists(quantised_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(model_path, quantised_path, weight_type=QuantType.QInt8)
+        return quantised_path
+
+    def __load_class_names(self, class_names_path: str):
+        """Read the class names from the model metadata (as written by YOLO exports), or from class_names_path"""
+        names = self.session.get_modelmeta().custom_metadata_map.get('names')
+        if names is not None:
+            names = ast.literal_eval(names)
+            return [names[i] for i in sorted(names)] if isinstance(names, dict) else list(names)
+
+        with open(class_names_path) as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def detect(self, frame: np.ndarray, confidence: float, iou_threshold: float) -> sv.Detections:
+        """Run the model on a BGR frame
+
+        Args:
+            frame (np.ndarray): BGR image as loaded by cv2.imread
+            confidence (float): minimum confidence of a detection
+            iou_threshold (float): IoU above which overlapping detections are suppressed
+
+        Returns:
+            sv.Detections: detections with a 'class_name' data field
+        """
+        # Letterbox the frame into the model input, keeping the aspect ratio
+        frame_height, frame_width = frame.shape[:2]
+        scale = min(self.input_width / frame_width, self.input_height / frame_height)
+        resized_width, resized_height = round(frame_width * scale), round(frame_height * scale)
+        pad_x, pad_y = (self.input_width - resized_width) // 2, (self.input_height - resized_height) // 2
+
+        letterboxed = np.full((self.input_height, self.input_width, 3), 114, dtype=np.uint8)
+        letterboxed[pad_y:pad_y + resized_height, pad_x:pad_x + resized_width] = cv2.resize(frame, (resized_width, resized_height))
+        blob = cv2.dnn.blobFromImage(letterboxed, scalefactor=1 / 255, swapRB=True)
+
+        # YOLO output is (1, 4 + number of classes, number of candidates), boxes as centre x, centre y, width, height
+        output = self.session.run(None, {self.input_name: blob})[0][0].T
+        scores = output[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences >= confidence
+        boxes, class_ids, confidences = output[keep, :4], class_ids[keep], confidences[keep]
+
+        # Map the boxes back from the letterboxed input to the original frame
+        xyxy = np.empty_like(boxes)
+        xyxy[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2 - pad_x) / scale
+        xyxy[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2 - pad_y) / scale
+        xyxy[:, 2] = (boxes[:, 0] + boxes[:, 2] / 2 - pad_x) / scale
+        xyxy[:, 3] = (boxes[:, 1] + boxes[:, 3] / 2 - pad_y) / scale
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, frame_width)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, frame_height)
+
+        detections = sv.Detections(
+            xyxy=xyxy.astype(np.float32),
+            confidence=confidences.astype(np.float32),
+            class_id=class_ids.astype(int),
+            data={'class_name': np.array([self.class_names[i] for i in class_ids], dtype=str)},
+        )
+        # Suppress overlapping boxes of the same class
+        return detections.with_nms(threshold=iou_threshold)
+
+
+def get_detector(backend: str = DETECTOR_BACKEND):
+    """Create the detector for the configured backend
+
+    Args:
+        backend (str): "roboflow" for the hosted model, "onnx" for local weights on ONNX Runtime
+
+    Returns:
+        Detector with a detect(frame, confidence, iou_threshold) method returning sv.Detections
+    """
+    if backend == "onnx":
+        return OnnxDetector()
+    if backend == "roboflow":
+        return RoboflowDetector()
+    raise ValueError(f"Unknown detector backend: {backend}")
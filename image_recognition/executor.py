@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+import numpy as np
+import supervision as sv
+
+from consts import INFERENCE_DEADLINE, INFERENCE_QUEUE_SIZE, INFERENCE_REPLICAS
+
+
+class InferenceOverloaded(Exception):
+    """Raised when a frame is submitted while the inference queue is full"""
+
+
+class InferenceDeadlineExceeded(Exception):
+    """Raised when a frame could not be served before its deadline"""
+
+
+class InferenceExecutor:
+    """
+    Runs detections on a fixed set of model replicas, one worker thread per replica, fed by a bounded queue
+
+    Frames are rejected straight away when the queue is full, and dropped without inference if their deadline passes
+    while they wait, so bursts fail fast instead of piling up behind the model.
+    """
+    def __init__(self, detector_factory, replicas: int = INFERENCE_REPLICAS, queue_size: int = INFERENCE_QUEUE_SIZE):
+        """
+        Args:
+            detector_factory (Callable): Creates one detector replica, e.g. image_recognition.get_detector
+            replicas (int): Number of detector replicas (and worker threads)
+            queue_size (int): Number of frames that may wait for a free replica before new frames are rejected
+        """
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.total_service_time = 0.0
+        self.total_wait_time = 0.0
+
+        # Replicas are created up front so the first requests do not pay for loading the model
+        self.workers = []
+        for i in range(replicas):
+            worker = threading.Thread(target=self.__serve, args=(detector_factory(),), name=f"inference-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def __serve(self, detector):
+        """Worker loop, runs the queued frames on this worker's replica"""
+        while True:
+            frame, confidence, iou_threshold, deadline, submitted, future = self.queue.get()
+
+            # The caller gave up on this frame while it was queued
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            started = time.monotonic()
+            if started > deadline:
+                with self.lock:
+                    self.expired += 1
+                future.set_exception(InferenceDeadlineExceeded("Frame expired while waiting for a free model replica"))
+                continue
+
+            with self.lock:
+                self.in_flight += 1
+            try:
+                future.set_result(detector.detect(frame, confidence=confidence, iou_threshold=iou_threshold))
+            except Exception as error:
+                future.set_exception(error)
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+                    self.completed += 1
+                    self.total_service_time += time.monotonic() - started
+                    self.total_wait_time += started - submitted
+
+    def submit(self, frame: np.ndarray, confidence: float, iou_threshold: float, deadline: float) -> Future:
+        """Queue a frame for detection without waiting for the result
+
+        Args:
+            frame (np.ndarray): BGR image as loaded by cv2.imread
+            confidence (float): minimum confidence of a detection
+            iou_threshold (float): IoU above which overlapping detections are suppressed
+            deadline (float): time.monotonic() value after which the frame is no longer worth serving
+
+        Returns:
+            Future: resolves to the sv.Detections of the frame
+
+        Raises:
+            InferenceOverloaded: if the queue is full
+        """
+        future = Future()
+        try:
+            self.queue.put_nowait((frame, confidence, iou_threshold, deadline, time.monotonic(), future))
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            raise InferenceOverloaded("Inference queue is full")
+        return future
+
+    def detect(self, frame: np.ndarray, confidence: float, iou_threshold: float, timeout: float = INFERENCE_DEADLINE) -> sv.Detections:
+        """Run a frame through the next free replica and wait for the result
+
+        Args:
+            frame (np.ndarray): BGR image as loaded by cv2.imread
+            confidence (float): minimum confidence of a detection
+            iou_threshold (float): IoU above which overlapping detections are suppressed
+            timeout (float): seconds the caller is willing to wait, including time spent queued
+
+        Returns:
+            sv.Detections: detections with a 'class_name' data field
+
+        Raises:
+            InferenceOverloaded: if the queue is full
+            InferenceDeadlineExceeded: if the frame was not served within the timeout
+        """
+        deadline = time.monotonic() + timeout
+        future = self.submit(frame, confidence, iou_threshold, deadline)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            # Drop the frame if it is still queued, a replica that already started on it will finish regardless
+            future.cancel()
+            with self.lock:
+                self.expired += 1
+            raise InferenceDeadlineExceeded(f"No result within {timeout}s")
+
+    def get_stats(self) -> dict:
+        """Returns queue depth and timing counters, for sizing the number of replicas
+
+        Returns:
+            dict: {replicas, queue_depth, queue_size, in_flight, completed, rejected, expired, mean_service_time, mean_wait_time}
+        """
+        with self.lock:
+            return {
+                'replicas': len(self.workers),
+                'queue_depth': self.queue.qsize(),
+                'queue_size': self.queue.maxsize,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'expired': self.expired,
+                'mean_service_time': self.total_service_time / self.completed if self.completed else 0.0,
+                'mean_wait_time': self.total_wait_time / self.completed if self.completed else 0.0,
+            }
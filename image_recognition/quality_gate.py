@@ -0,0 +1,106 @@
+import threading
+from collections import Counter
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from consts import (QUALITY_GATE_BLUR, QUALITY_GATE_BRIGHT, QUALITY_GATE_CONTRAST, QUALITY_GATE_DARK,
+                    QUALITY_GATE_DUPLICATE, QUALITY_GATE_WIDTH)
+
+
+class FrameQualityGate:
+    """
+    Cheap checks run on a small grayscale copy of each frame before inference
+
+    Frames that are too dark or bright, too flat, too blurry, or near-identical to the previous frame of the same
+    obstacle would come back from the model with no useful detection, so they are rejected with a reason code instead.
+    """
+    def __init__(
+            self,
+            width: int = QUALITY_GATE_WIDTH,
+            dark: float = QUALITY_GATE_DARK,
+            bright: float = QUALITY_GATE_BRIGHT,
+            contrast: float = QUALITY_GATE_CONTRAST,
+            blur: float = QUALITY_GATE_BLUR,
+            duplicate: float = QUALITY_GATE_DUPLICATE
+            ):
+        """
+        Args:
+            width (int): width the frame is downscaled to before checking
+            dark (float): mean gray level below which the frame is underexposed
+            bright (float): mean gray level above which the frame is overexposed
+            contrast (float): gray level standard deviation below which the frame is empty
+            blur (float): variance of the Laplacian below which the frame is blurry
+            duplicate (float): mean absolute difference to the obstacle's previous frame below which it is a duplicate
+        """
+        self.width = width
+        self.dark = dark
+        self.bright = bright
+        self.contrast = contrast
+        self.blur = blur
+        self.duplicate = duplicate
+        self.lock = threading.Lock()
+        self.previous_frames = dict()
+        self.counters = Counter()
+
+    def reset(self):
+        """Forget the previous frame of every obstacle, called when a new run is planned"""
+        with self.lock:
+            self.previous_frames.clear()
+
+    def __get_small(self, frame: np.ndarray) -> np.ndarray:
+        """Downscaled grayscale copy of the frame that the checks are run on"""
+        height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+        return cv2.cvtColor(cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+    def check(self, frame: np.ndarray, obstacle_id: str) -> Optional[str]:
+        """Check whether the frame is worth running inference on. Passing frames are only compared against by later
+        frames of the obstacle once remember is called with them
+
+        Args:
+            frame (np.ndarray): BGR image as loaded by cv2.imread
+            obstacle_id (str): obstacle id taken from the frame's filename
+
+        Returns:
+            str: reason code ("underexposed", "overexposed", "empty", "blurry" or "duplicate"), or None if the frame passes
+        """
+        small = self.__get_small(frame)
+
+        mean, std = cv2.meanStdDev(small)
+        reason = None
+        if mean[0][0] < self.dark:
+            reason = "underexposed"
+        elif mean[0][0] > self.bright:
+            reason = "overexposed"
+        elif std[0][0] < self.contrast:
+            reason = "empty"
+        elif cv2.Laplacian(small, cv2.CV_64F).var() < self.blur:
+            reason = "blurry"
+
+        with self.lock:
+            if reason is None:
+                previous = self.previous_frames.get(obstacle_id)
+                if previous is not None and previous.shape == small.shape and cv2.absdiff(small, previous).mean() < self.duplicate:
+                    reason = "duplicate"
+            self.counters[reason or "passed"] += 1
+
+        return reason
+
+    def remember(self, frame: np.ndarray, obstacle_id: str):
+        """Keep the frame as the obstacle's previous frame, called once inference ran on it. A frame whose inference
+        failed, such as when the executor was overloaded, is not kept, so that the robot sending it again is not
+        rejected as a duplicate
+
+        Args:
+            frame (np.ndarray): BGR image as loaded by cv2.imread
+            obstacle_id (str): obstacle id taken from the frame's filename
+        """
+        small = self.__get_small(frame)
+        with self.lock:
+            self.previous_frames[obstacle_id] = small
+
+    def get_stats(self) -> dict:
+        """Returns how many frames passed and how many were rejected for each reason"""
+        with self.lock:
+            return dict(self.counters)
@@ -0,0 +1,56 @@
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+import supervision as sv
+
+from consts import INFERENCE_INPUT_SIZE, ROI_BANDS
+
+
+def get_roi(frame_shape, signal: Optional[str], roi: Optional[str] = None) -> Tuple[int, int, int, int]:
+    """Region of the frame the symbol is expected in
+
+    Args:
+        frame_shape (Tuple): shape of the frame, (height, width, channels)
+        signal (str): signal field of the filename (L, C or R, from the SNAP command), None if absent
+        roi (str): explicit region "x0,y0,x1,y1" in pixels sent by the robot, takes precedence over the signal
+
+    Returns:
+        Tuple: (x0, y0, x1, y1) in pixels, the whole frame if neither the signal nor roi are usable
+    """
+    height, width = frame_shape[:2]
+    if roi:
+        try:
+            x0, y0, x1, y1 = (int(v) for v in roi.split(","))
+        except ValueError:
+            x0 = y0 = x1 = y1 = 0
+        x0, x1 = max(0, min(x0, width)), max(0, min(x1, width))
+        y0, y1 = max(0, min(y0, height)), max(0, min(y1, height))
+        if x1 > x0 and y1 > y0:
+            return x0, y0, x1, y1
+
+    band = ROI_BANDS.get(signal)
+    if band is None:
+        return 0, 0, width, height
+    return round(band[0] * width), round(band[1] * height), round(band[2] * width), round(band[3] * height)
+
+
+def crop_to_roi(frame: np.ndarray, roi: Tuple[int, int, int, int], input_size: int = INFERENCE_INPUT_SIZE):
+    """Crop the frame to the region of interest and shrink it so its longest side is at most input_size
+
+    Returns:
+        Tuple: (cropped frame, scale applied after cropping)
+    """
+    x0, y0, x1, y1 = roi
+    cropped = frame[y0:y1, x0:x1]
+    scale = min(1.0, input_size / max(cropped.shape[:2]))
+    if scale < 1.0:
+        cropped = cv2.resize(cropped, (round(cropped.shape[1] * scale), round(cropped.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+    return cropped, scale
+
+
+def map_to_frame(detections: sv.Detections, roi: Tuple[int, int, int, int], scale: float) -> sv.Detections:
+    """Map the boxes of detections made on a crop_to_roi output back to the original frame, in place"""
+    if len(detections):
+        detections.xyxy = detections.xyxy / scale + np.array([roi[0], roi[1], roi[0], roi[1]], dtype=detections.xyxy.dtype)
+    return detections
@@ -1,2 +1,6 @@
 from .path_finder import PathFinder
+from .path_library import PathLibrary
+from .run_plan import RunPlan
+from .search_trace import SearchTrace
+from .solution_store import SolutionStore
 from .helper import *
\ No newline at end of file
@@ -89,10 +89,48 @@ def coordinate_cal(path_results, command, i):
     
     return path_results, i    
 
-def command_generator(robot_path, obstacles):
+# Unit vector of each direction the robot can face, a straight move along it is forward and against it backward
+HEADINGS = {Direction.NORTH: (0, 1), Direction.EAST: (1, 0), Direction.SOUTH: (0, -1), Direction.WEST: (-1, 0)}
+
+# Turn command for each (direction before, direction after, whether y increased), with the cells the robot sweeps through
+# on the way, as (dx, dy, direction) from the cell the turn starts at
+TURNS = {
+    (Direction.NORTH, Direction.EAST, True): ("FR00", ((0, 1, Direction.NORTH), (0, 2, Direction.NORTH), (1, 2, Direction.EAST))),
+    (Direction.NORTH, Direction.EAST, False): ("BL00", ((0, -1, Direction.NORTH), (0, -2, Direction.NORTH), (-1, -2, Direction.EAST))),
+    (Direction.NORTH, Direction.WEST, True): ("FL00", ((0, 1, Direction.NORTH), (0, 2, Direction.NORTH), (-1, 2, Direction.WEST))),
+    (Direction.NORTH, Direction.WEST, False): ("BR00", ((0, -1, Direction.NORTH), (0, -2, Direction.NORTH), (1, -2, Direction.WEST))),
+    (Direction.EAST, Direction.NORTH, True): ("FL00", ((1, 0, Direction.EAST), (2, 0, Direction.EAST), (2, 1, Direction.NORTH))),
+    (Direction.EAST, Direction.NORTH, False): ("BR00", ((-1, 0, Direction.EAST), (-2, 0, Direction.EAST), (-2, -1, Direction.NORTH))),
+    (Direction.EAST, Direction.SOUTH, True): ("BL00", ((-1, 0, Direction.EAST), (-2, 0, Direction.EAST), (-2, 1, Direction.SOUTH))),
+    (Direction.EAST, Direction.SOUTH, False): ("FR00", ((1, 0, Direction.EAST), (2, 0, Direction.EAST), (2, -1, Direction.SOUTH))),
+    (Direction.SOUTH, Direction.EAST, True): ("BR00", ((0, 1, Direction.SOUTH), (0, 2, Direction.SOUTH), (-1, 2, Direction.EAST))),
+    (Direction.SOUTH, Direction.EAST, False): ("FL00", ((0, -1, Direction.SOUTH), (0, -2, Direction.SOUTH), (1, -2, Direction.EAST))),
+    (Direction.SOUTH, Direction.WEST, True): ("BL00", ((0, 1, Direction.SOUTH), (0, 2, Direction.SOUTH), (1, 2, Direction.WEST))),
+    (Direction.SOUTH, Direction.WEST, False): ("FR00", ((0, -1, Direction.SOUTH), (0, -2, Direction.SOUTH), (-1, -2, Direction.WEST))),
+    (Direction.WEST, Direction.NORTH, True): ("FR00", ((-1, 0, Direction.WEST), (-2, 0, Direction.WEST), (-2, 1, Direction.NORTH))),
+    (Direction.WEST, Direction.NORTH, False): ("BL00", ((1, 0, Direction.WEST), (2, 0, Direction.WEST), (2, -1, Direction.NORTH))),
+    (Direction.WEST, Direction.SOUTH, True): ("BR00", ((1, 0, Direction.WEST), (2, 0, Direction.WEST), (2, 1, Direction.SOUTH))),
+    (Direction.WEST, Direction.SOUTH, False): ("FL00", ((-1, 0, Direction.WEST), (-2, 0, Direction.WEST), (-2, -1, Direction.SOUTH))),
+}
+
+# SNAP suffix for each (obstacle direction, robot direction) where the robot faces the image: the coordinate (0 for x,
+# 1 for y) the obstacle and robot are compared on, and the suffix when the obstacle's is greater, equal and smaller
+SNAP_SIDES = {
+    (Direction.WEST, Direction.EAST): (1, ("L", "C", "R")),
+    (Direction.EAST, Direction.WEST): (1, ("R", "C", "L")),
+    (Direction.NORTH, Direction.SOUTH): (0, ("L", "C", "R")),
+    (Direction.SOUTH, Direction.NORTH): (0, ("R", "C", "L")),
+}
+
+# Longest straight move the robot takes as one command, in 10cm steps
+MAX_STRAIGHT_STEPS = 9
+
+
+def generate_commands(robot_path, obstacles):
     """
-    This function takes in a list of robot_path and generates a list of commands for the robot to follow
-    
+    This function takes in a list of robot_path and generates, in a single pass, the list of commands for the robot to
+    follow and the extended path shown by the simulator
+
     Inputs
     ------
     robot_path: list of Robot State objects
@@ -100,248 +138,102 @@ def command_generator(robot_path, obstacles):
 
     Returns
     -------
-    commands: list of commands for the robot to follow
+    commands: list of commands for the robot to follow, consecutive straight moves merged into one of up to 90cm
+    extended_path: list of the robot's states as dictionaries with keys "x", "y", "d", and "s", including the states
+        each turn sweeps through
     """
-
     # Convert the list of obstacles into a dictionary with key as the obstacle id and value as the obstacle
     obstacles_dict = {ob['id']: ob for ob in obstacles}
-
-    # print("Robot Path: ")
-    # for path in robot_path:
-    #     print(f"Path: {path}")
-
-    # print("Obstacles: ")
-    # for ob in obstacles:
-    #     print(ob)
-    
-    # Initialize commands list
     commands = []
-
-    # Iterate through each state in the list of robot_path
-    for i in range(1, len(robot_path)):
-        steps = "00"
-
-        # If previous state and current state are the same direction,
-        if robot_path[i].direction == robot_path[i - 1].direction:
-            # Forward - Must be (east facing AND x value increased) OR (north facing AND y value increased)
-            if (robot_path[i].x > robot_path[i - 1].x and robot_path[i].direction == Direction.EAST) or (robot_path[i].y > robot_path[i - 1].y and robot_path[i].direction == Direction.NORTH):
-                commands.append("FW10")
-            # Forward - Must be (west facing AND x value decreased) OR (south facing AND y value decreased)
-            elif (robot_path[i].x < robot_path[i-1].x and robot_path[i].direction == Direction.WEST) or (
-                    robot_path[i].y < robot_path[i-1].y and robot_path[i].direction == Direction.SOUTH):
-                commands.append("FW10")
-            # Backward - All other cases where the previous and current state is the same direction
-            else:
-                commands.append("BW10")
-
-            # If any of these robot_path has a valid screenshot ID, then add a SNAP command as well to take a picture
-            if robot_path[i].screenshot_id != -1:
-                # NORTH = 0
-                # EAST = 2
-                # SOUTH = 4
-                # WEST = 6
-
-                current_ob_dict = obstacles_dict[robot_path[i].screenshot_id] # {'x': 9, 'y': 10, 'd': 6, 'id': 9}
-                current_robot_position = robot_path[i] # {'x': 1, 'y': 8, 'd': <Direction.NORTH: 0>, 's': -1}
-
-                # Obstacle facing WEST, robot facing EAST
-                if current_ob_dict['d'] == 6 and current_robot_position.direction == 2:
-                    if current_ob_dict['y'] > current_robot_position.y:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}_L")
-                    elif current_ob_dict['y'] == current_robot_position.y:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}_C")
-                    elif current_ob_dict['y'] < current_robot_position.y:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}_R")
-                    else:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}")
-                
-                # Obstacle facing EAST, robot facing WEST
-                elif current_ob_dict['d'] == 2 and current_robot_position.direction == 6:
-                    if current_ob_dict['y'] > current_robot_position.y:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}_R")
-                    elif current_ob_dict['y'] == current_robot_position.y:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}_C")
-                    elif current_ob_dict['y'] < current_robot_position.y:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}_L")
-                    else:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}")
-
-                # Obstacle facing NORTH, robot facing SOUTH
-                elif current_ob_dict['d'] == 0 and current_robot_position.direction == 4:
-                    if current_ob_dict['x'] > current_robot_position.x:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}_L")
-                    elif current_ob_dict['x'] == current_robot_position.x:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}_C")
-                    elif current_ob_dict['x'] < current_robot_position.x:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}_R")
-                    else:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}")
-
-                # Obstacle facing SOUTH, robot facing NORTH
-                elif current_ob_dict['d'] == 4 and current_robot_position.direction == 0:
-                    if current_ob_dict['x'] > current_robot_position.x:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}_R")
-                    elif current_ob_dict['x'] == current_robot_position.x:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}_C")
-                    elif current_ob_dict['x'] < current_robot_position.x:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}_L")
-                    else:
-                        commands.append(f"SNAP{robot_path[i].screenshot_id}")
-            continue
-
-        # If previous state and current state are not the same direction, it means that there will be a turn command involved
-        # Assume there are 4 turning command: FR, FL, BL, BR (the turn command will turn the robot 90 degrees)
-        # FR00 | FR30: Forward Right;
-        # FL00 | FL30: Forward Left;
-        # BR00 | BR30: Backward Right;
-        # BL00 | BL30: Backward Left;
-
-        # Facing north previously
-        if robot_path[i - 1].direction == Direction.NORTH:
-            # Facing east afterwards
-            if robot_path[i].direction == Direction.EAST:
-                # y value increased -> Forward Right
-                if robot_path[i].y > robot_path[i - 1].y:
-                    commands.append("FR{}".format(steps))
-                # y value decreased -> Backward Left
-                else:
-                    commands.append("BL{}".format(steps))
-            # Facing west afterwards
-            elif robot_path[i].direction == Direction.WEST:
-                # y value increased -> Forward Left
-                if robot_path[i].y > robot_path[i - 1].y:
-                    commands.append("FL{}".format(steps))
-                # y value decreased -> Backward Right
-                else:
-                    commands.append("BR{}".format(steps))
-            else:
-                raise Exception("Invalid turning direction")
-
-        elif robot_path[i - 1].direction == Direction.EAST:
-            if robot_path[i].direction == Direction.NORTH:
-                if robot_path[i].y > robot_path[i - 1].y:
-                    commands.append("FL{}".format(steps))
-                else:
-                    commands.append("BR{}".format(steps))
-
-            elif robot_path[i].direction == Direction.SOUTH:
-                if robot_path[i].y > robot_path[i - 1].y:
-                    commands.append("BL{}".format(steps))
-                else:
-                    commands.append("FR{}".format(steps))
-            else:
-                raise Exception("Invalid turning direction")
-
-        elif robot_path[i - 1].direction == Direction.SOUTH:
-            if robot_path[i].direction == Direction.EAST:
-                if robot_path[i].y > robot_path[i - 1].y:
-                    commands.append("BR{}".format(steps))
-                else:
-                    commands.append("FL{}".format(steps))
-            elif robot_path[i].direction == Direction.WEST:
-                if robot_path[i].y > robot_path[i - 1].y:
-                    commands.append("BL{}".format(steps))
-                else:
-                    commands.append("FR{}".format(steps))
-            else:
-                raise Exception("Invalid turning direction")
-
-        elif robot_path[i - 1].direction == Direction.WEST:
-            if robot_path[i].direction == Direction.NORTH:
-                if robot_path[i].y > robot_path[i - 1].y:
-                    commands.append("FR{}".format(steps))
-                else:
-                    commands.append("BL{}".format(steps))
-            elif robot_path[i].direction == Direction.SOUTH:
-                if robot_path[i].y > robot_path[i - 1].y:
-                    commands.append("BR{}".format(steps))
-                else:
-                    commands.append("FL{}".format(steps))
-            else:
-                raise Exception("Invalid turning direction")
+    extended_path = []
+    if not robot_path:
+        return ["FIN"], extended_path
+
+    # Straight moves not turned into commands yet: "FW" or "BW", and the number of 10cm steps
+    straight, steps = None, 0
+
+    cells = iter(robot_path)
+    previous = next(cells)
+    previous_x, previous_y, previous_direction = previous.x, previous.y, int(previous.direction)
+    extended_path.append({'x': previous_x, 'y': previous_y, 'd': previous.direction, 's': previous.screenshot_id})
+
+    for cell in cells:
+        x, y, direction = cell.x, cell.y, int(cell.direction)
+
+        if (x, y, direction) == (previous_x, previous_y, previous_direction):
+            # A second stop at the same state, to take another picture there
+            pass
+        elif direction == previous_direction:
+            heading_x, heading_y = HEADINGS.get(direction, (0, 0))
+            move = "FW" if (x - previous_x) * heading_x + (y - previous_y) * heading_y > 0 else "BW"
+            if move != straight:
+                if steps:
+                    commands.extend(get_straight_commands(straight, steps))
+                straight, steps = move, 0
+            steps += 1
         else:
-            raise Exception("Invalid position")
-
-        # If any of these robot_path has a valid screenshot ID, then add a SNAP command as well to take a picture
-        if robot_path[i].screenshot_id != -1:  
-            # NORTH = 0
-            # EAST = 2
-            # SOUTH = 4
-            # WEST = 6
+            turn = TURNS.get((previous_direction, direction, y > previous_y))
+            if turn is None:
+                raise Exception("Invalid turning direction" if previous_direction in HEADINGS else "Invalid position")
+            if steps:
+                commands.extend(get_straight_commands(straight, steps))
+                straight, steps = None, 0
+
+            command, swept_cells = turn
+            commands.append(command)
+            for dx, dy, swept_direction in swept_cells:
+                extended_path.append({'x': previous_x + dx, 'y': previous_y + dy, 'd': swept_direction, 's': -1})
+
+        extended_path.append({'x': x, 'y': y, 'd': cell.direction, 's': cell.screenshot_id})
+
+        # If the cell has a valid screenshot ID, then add a SNAP command as well to take a picture, suffixed by the side
+        # of the robot's centre line the obstacle is on
+        if cell.screenshot_id != -1:
+            ob = obstacles_dict[cell.screenshot_id]
+            side = SNAP_SIDES.get((int(ob['d']), direction))
+            if side is not None:
+                if steps:
+                    commands.extend(get_straight_commands(straight, steps))
+                    straight, steps = None, 0
+                axis, suffixes = side
+                obstacle_coordinate, robot_coordinate = (ob['y'], y) if axis else (ob['x'], x)
+                if obstacle_coordinate > robot_coordinate:
+                    suffix = suffixes[0]
+                elif obstacle_coordinate == robot_coordinate:
+                    suffix = suffixes[1]
+                else:
+                    suffix = suffixes[2]
+                commands.append(f"SNAP{cell.screenshot_id}_{suffix}")
 
-            current_ob_dict = obstacles_dict[robot_path[i].screenshot_id] # {'x': 9, 'y': 10, 'd': 6, 'id': 9}
-            current_robot_position = robot_path[i] # {'x': 1, 'y': 8, 'd': <Direction.NORTH: 0>, 's': -1}
+        previous_x, previous_y, previous_direction = x, y, direction
 
-            # Obstacle facing WEST, robot facing EAST
-            if current_ob_dict['d'] == 6 and current_robot_position.direction == 2:
-                if current_ob_dict['y'] > current_robot_position.y:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}_L")
-                elif current_ob_dict['y'] == current_robot_position.y:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}_C")
-                elif current_ob_dict['y'] < current_robot_position.y:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}_R")
-                else:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}")
-            
-            # Obstacle facing EAST, robot facing WEST
-            elif current_ob_dict['d'] == 2 and current_robot_position.direction == 6:
-                if current_ob_dict['y'] > current_robot_position.y:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}_R")
-                elif current_ob_dict['y'] == current_robot_position.y:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}_C")
-                elif current_ob_dict['y'] < current_robot_position.y:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}_L")
-                else:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}")
+    if steps:
+        commands.extend(get_straight_commands(straight, steps))
+    # Final command is the stop command (FIN)
+    commands.append("FIN")
 
-            # Obstacle facing NORTH, robot facing SOUTH
-            elif current_ob_dict['d'] == 0 and current_robot_position.direction == 4:
-                if current_ob_dict['x'] > current_robot_position.x:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}_L")
-                elif current_ob_dict['x'] == current_robot_position.x:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}_C")
-                elif current_ob_dict['x'] < current_robot_position.x:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}_R")
-                else:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}")
+    return commands, extended_path
 
-            # Obstacle facing SOUTH, robot facing NORTH
-            elif current_ob_dict['d'] == 4 and current_robot_position.direction == 0:
-                if current_ob_dict['x'] > current_robot_position.x:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}_R")
-                elif current_ob_dict['x'] == current_robot_position.x:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}_C")
-                elif current_ob_dict['x'] < current_robot_position.x:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}_L")
-                else:
-                    commands.append(f"SNAP{robot_path[i].screenshot_id}")
 
-    # Final command is the stop command (FIN)
-    commands.append("FIN")  
+def get_straight_commands(move, steps):
+    """Split a straight move of the given number of 10cm steps into commands of up to MAX_STRAIGHT_STEPS steps"""
+    commands = [f"{move}{MAX_STRAIGHT_STEPS * 10}"] * (steps // MAX_STRAIGHT_STEPS)
+    if steps % MAX_STRAIGHT_STEPS:
+        commands.append(f"{move}{steps % MAX_STRAIGHT_STEPS * 10}")
+    return commands
 
-    # Compress commands if there are consecutive forward or backward commands
-    compressed_commands = [commands[0]]
 
-    for i in range(1, len(commands)):
-        # If both commands are BW
-        if commands[i].startswith("BW") and compressed_commands[-1].startswith("BW"):
-            # Get the number of steps of previous command
-            steps = int(compressed_commands[-1][2:])
-            # If steps are not 90, add 10 to the steps
-            if steps != 90:
-                compressed_commands[-1] = "BW{}".format(steps + 10)
-                continue
+def command_generator(robot_path, obstacles):
+    """
+    This function takes in a list of robot_path and generates a list of commands for the robot to follow
 
-        # If both commands are FW
-        elif commands[i].startswith("FW") and compressed_commands[-1].startswith("FW"):
-            # Get the number of steps of previous command
-            steps = int(compressed_commands[-1][2:])
-            # If steps are not 90, add 10 to the steps
-            if steps != 90:
-                compressed_commands[-1] = "FW{}".format(steps + 10)
-                continue
-        
-        # Otherwise, just add as usual
-        compressed_commands.append(commands[i])
+    Inputs
+    ------
+    robot_path: list of Robot State objects
+    obstacles: list of obstacles, each obstacle is a dictionary with keys "x", "y", "d", and "id"
 
-    return compressed_commands
+    Returns
+    -------
+    commands: list of commands for the robot to follow
+    """
+    return generate_commands(robot_path, obstacles)[0]
@@ -0,0 +1,333 @@
+import heapq
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from consts import (HPA_CLUSTER_SIZE, HPA_CORRIDOR_WIDTH, HPA_HEURISTIC_WEIGHT, HPA_LONG_ENTRANCE, TURN_FACTOR, TURN_RADIUS,
+                    VIRTUAL_CELLS)
+from direction import Direction
+
+from .path_library import PADDING
+
+# Least a turn costs beyond the distance it covers: 2 rotation steps, the move itself and the flat 10 of a turn in
+# PathFinder.__get_neighbors, against the TURN_RADIUS cells it covers in each direction
+TURN_EXCESS = 2 * TURN_FACTOR + 1 + 10 - sum(TURN_RADIUS)
+
+
+def get_heuristic(state, end) -> int:
+    """Lower bound of the cost from state to end: the Manhattan distance, plus the excess cost of the turns needed to
+    reach end's direction and, when it is not reachable by driving straight, to get onto the right line
+
+    Args:
+        state (Tuple): (x, y, direction) state
+        end (Tuple): (x, y, direction) goal state
+
+    Returns:
+        int: heuristic cost
+    """
+    dx, dy = end[0] - state[0], end[1] - state[1]
+    rotation = abs(state[2] - end[2]) % 8
+    quarter_turns = min(rotation, 8 - rotation) // 2
+    if quarter_turns == 0:
+        sideways = dx if state[2] in (Direction.NORTH, Direction.SOUTH) else dy
+        quarter_turns = 2 if sideways else 0
+    return abs(dx) + abs(dy) + quarter_turns * TURN_EXCESS
+
+
+class HierarchicalSearch:
+    """
+    HPA* style search over large arenas
+
+    The arena is split into square clusters. Wherever the robot can drive straight across the border between two
+    clusters, an entrance is placed: the states on either side of the border, facing along the crossing, become nodes
+    of an abstract graph, joined by the single move across. Nodes of the same cluster are joined by the cost of the
+    cheapest path between them that stays inside the cluster.
+
+    Intra-cluster costs are computed the first time a node is expanded and kept for the lifetime of the search, so the
+    legs of a tour share them. A leg is searched over the abstract graph first, which gives an upper bound of its cost.
+    The cells of the path are then found by refine, searching the corridor of clusters the abstract path passes through,
+    which PathFinder leaves until a tour takes the leg when the leg is long.
+    """
+    def __init__(self, arena, get_moves: Callable, cluster_size: int = HPA_CLUSTER_SIZE):
+        """
+        Args:
+            arena (Arena): Arena to search
+            get_moves (Callable): function of (x, y, direction) returning the moves out of that state as
+                (x, y, direction, move cost) tuples
+            cluster_size (int): Size of the clusters in cells
+        """
+        self.arena = arena
+        self.get_moves = get_moves
+        self.cluster_size = cluster_size
+        # Abstract nodes of each cluster, and the moves across the cluster borders out of each node
+        self.cluster_nodes = dict()
+        self.inter_edges = dict()
+        # Costs of the intra-cluster search from each state, and the abstract edges they give, computed on first use
+        self.cluster_searches = dict()
+        self.intra_edges = dict()
+        # Moves out of each state, shared by the intra-cluster searches of a cluster
+        self.moves = dict()
+        # Moves out of the open cells are the same everywhere up to translation, so they are worked out once per direction
+        self.open_cells = self.__get_open_cells()
+        self.open_moves = dict()
+        # Likewise for the intra-cluster searches of clusters made only of open cells, shared by their position in the cluster
+        self.open_clusters = self.__get_open_clusters()
+        self.open_cluster_searches = dict()
+
+        self.__build_entrances()
+
+    def __get_cluster(self, state) -> Tuple:
+        return state[0] // self.cluster_size, state[1] // self.cluster_size
+
+    def get_cluster_distance(self, start, end) -> int:
+        """Number of clusters between the clusters of start and end, counting diagonal steps as one"""
+        (start_x, start_y), (end_x, end_y) = self.__get_cluster(start), self.__get_cluster(end)
+        return max(abs(start_x - end_x), abs(start_y - end_y))
+
+    def __get_open_cells(self) -> List[List[bool]]:
+        """Find the cells too far from every obstacle and wall for them to affect any move out of the cell
+
+        Returns:
+            List[List[bool]]: open_cells[x][y] is True if (x, y) is open
+        """
+        width, height = self.arena.arena_width, self.arena.arena_height
+        # Moves look up to PADDING cells away, where obstacles block or add a safe cost up to VIRTUAL_CELLS further
+        radius = PADDING + VIRTUAL_CELLS
+        open_cells = np.zeros((width, height), dtype=bool)
+        open_cells[PADDING + 1:width - PADDING - 1, PADDING + 1:height - PADDING - 1] = True
+        for ob in self.arena.get_obstacles():
+            open_cells[max(ob.x - radius, 0):ob.x + radius + 1, max(ob.y - radius, 0):ob.y + radius + 1] = False
+        return open_cells.tolist()
+
+    def __get_open_clusters(self) -> set:
+        """Find the clusters in which every cell is open"""
+        open_clusters = set()
+        for cluster_x in range(self.arena.arena_width // self.cluster_size):
+            for cluster_y in range(self.arena.arena_height // self.cluster_size):
+                cells = range(self.cluster_size)
+                if all(self.open_cells[cluster_x * self.cluster_size + i][cluster_y * self.cluster_size + j] for i in cells for j in cells):
+                    open_clusters.add((cluster_x, cluster_y))
+        return open_clusters
+
+    def __to_cluster_frame(self, state, cluster) -> Tuple:
+        """Express a state relative to the bottom left cell of a cluster"""
+        return state[0] - cluster[0] * self.cluster_size, state[1] - cluster[1] * self.cluster_size, state[2]
+
+    def __get_moves(self, state):
+        if state in self.moves:
+            return self.moves[state]
+
+        x, y, direction = state
+        if not self.open_cells[x][y]:
+            self.moves[state] = self.get_moves(x, y, direction)
+            return self.moves[state]
+
+        if direction not in self.open_moves:
+            self.open_moves[direction] = [(next_x - x, next_y - y, new_direction, move_cost) for next_x, next_y, new_direction, move_cost in self.get_moves(x, y, direction)]
+        return [(x + dx, y + dy, new_direction, move_cost) for dx, dy, new_direction, move_cost in self.open_moves[direction]]
+
+    def __add_inter_edge(self, u, v):
+        """Join u and v in the abstract graph if the robot can move straight between them, in either direction"""
+        for a, b in ((u, v), (v, u)):
+            for x, y, direction, move_cost in self.__get_moves(a):
+                if (x, y, direction) == b:
+                    self.cluster_nodes.setdefault(self.__get_cluster(a), set()).add(a)
+                    self.inter_edges.setdefault(a, []).append((b, move_cost))
+                    break
+
+    def __build_entrances(self):
+        """Place the entrances along every border between two neighbouring clusters"""
+        width, height = self.arena.arena_width, self.arena.arena_height
+
+        # Borders between horizontally neighbouring clusters, crossed facing EAST or WEST
+        for border_x in range(self.cluster_size, width, self.cluster_size):
+            for segment_start in range(0, height, self.cluster_size):
+                span = range(segment_start, min(segment_start + self.cluster_size, height))
+                for y in self.__get_transitions([
+                    self.arena.is_reachable(border_x - 1, y) and self.arena.is_reachable(border_x, y) for y in span
+                ], segment_start):
+                    for direction in (Direction.EAST, Direction.WEST):
+                        self.__add_inter_edge((border_x - 1, y, direction), (border_x, y, direction))
+
+        # Borders between vertically neighbouring clusters, crossed facing NORTH or SOUTH
+        for border_y in range(self.cluster_size, height, self.cluster_size):
+            for segment_start in range(0, width, self.cluster_size):
+                span = range(segment_start, min(segment_start + self.cluster_size, width))
+                for x in self.__get_transitions([
+                    self.arena.is_reachable(x, border_y - 1) and self.arena.is_reachable(x, border_y) for x in span
+                ], segment_start):
+                    for direction in (Direction.NORTH, Direction.SOUTH):
+                        self.__add_inter_edge((x, border_y - 1, direction), (x, border_y, direction))
+
+    def __get_transitions(self, crossable: List[bool], offset: int) -> List[int]:
+        """Pick the crossing points of a cluster border, the middle of each open stretch or both of its ends if it is long
+
+        Args:
+            crossable (List[bool]): whether the border can be crossed at each cell along it
+            offset (int): coordinate of the first cell along the border
+
+        Returns:
+            List[int]: coordinates along the border to place an entrance at
+        """
+        transitions = []
+        start = None
+        for i, is_open in enumerate(crossable + [False]):
+            if is_open and start is None:
+                start = i
+            elif not is_open and start is not None:
+                if i - start >= HPA_LONG_ENTRANCE:
+                    transitions += [offset + start, offset + i - 1]
+                else:
+                    transitions.append(offset + (start + i - 1) // 2)
+                start = None
+        return transitions
+
+    def __search_cluster(self, source) -> dict:
+        """Dijkstra from source over the states of its cluster, moves leaving the cluster are not followed
+
+        Returns:
+            dict: cost of each state of the cluster reachable from source, keyed by the state relative to the cluster
+        """
+        cluster = self.__get_cluster(source)
+        if cluster in self.open_clusters:
+            searches, key = self.open_cluster_searches, self.__to_cluster_frame(source, cluster)
+        else:
+            searches, key = self.cluster_searches, source
+        if key in searches:
+            return searches[key]
+
+        cost = {source: 0}
+        heap = [(0, source)]
+        while heap:
+            cur_cost, state = heapq.heappop(heap)
+            if cur_cost > cost[state]:
+                continue
+            for x, y, direction, move_cost in self.__get_moves(state):
+                next_state = (x, y, direction)
+                if self.__get_cluster(next_state) != cluster:
+                    continue
+                if next_state not in cost or cost[next_state] > cur_cost + move_cost:
+                    cost[next_state] = cur_cost + move_cost
+                    heapq.heappush(heap, (cur_cost + move_cost, next_state))
+
+        searches[key] = {self.__to_cluster_frame(state, cluster): state_cost for state, state_cost in cost.items()}
+        return searches[key]
+
+    def __get_cluster_cost(self, source, target) -> Optional[int]:
+        """Cost from source to target without leaving their cluster, None if target cannot be reached that way"""
+        cluster = self.__get_cluster(source)
+        if self.__get_cluster(target) != cluster:
+            return None
+        return self.__search_cluster(source).get(self.__to_cluster_frame(target, cluster))
+
+    def __get_edges(self, state, end):
+        """Abstract edges out of state, including the edge to end when it is in the same cluster"""
+        if state not in self.intra_edges:
+            self.intra_edges[state] = []
+            for node in self.cluster_nodes.get(self.__get_cluster(state), ()):
+                cost = self.__get_cluster_cost(state, node)
+                if node != state and cost is not None:
+                    self.intra_edges[state].append((node, cost))
+
+        yield from self.intra_edges[state]
+        if end != state:
+            cost = self.__get_cluster_cost(state, end)
+            if cost is not None:
+                yield end, cost
+        yield from self.inter_edges.get(state, ())
+
+    def search(self, start, end) -> Optional[Tuple[int, Tuple]]:
+        """Search for a path from start to end over the abstract graph
+
+        Args:
+            start (Tuple): Start (x, y, direction) state
+            end (Tuple): End (x, y, direction) state
+
+        Returns:
+            Tuple: (cost, abstract path), the abstract path being the tuple of abstract nodes from start to end to pass
+                to refine, or None if there is no path. Refining the path never costs more than the cost returned.
+        """
+        start, end = tuple(start), tuple(end)
+
+        # Paths into end come from a node of its cluster, if none of them reaches it there is no need to search the
+        # whole abstract graph to find out
+        entry_excesses = []
+        for node in self.cluster_nodes.get(self.__get_cluster(end), ()):
+            cost = self.__get_cluster_cost(node, end)
+            if cost is not None:
+                entry_excesses.append(cost - get_heuristic(node, end))
+        if self.__get_cluster_cost(start, end) is None and not entry_excesses:
+            return None
+        # Entering end can cost far more than the heuristic, such as when end is close enough to an obstacle for the
+        # safe cost. The least excess of entering it from the nodes of its cluster is added to the heuristic, otherwise
+        # the whole abstract graph is expanded before end is
+        entry_excess = max(0, min(entry_excesses, default=0))
+
+        g_distance = {start: 0}
+        parent = dict()
+        # Ties on f are broken towards the deeper node, otherwise an open arena is one big plateau that gets expanded whole
+        heap = [(HPA_HEURISTIC_WEIGHT * get_heuristic(start, end), 0, start)]
+
+        while heap:
+            _, negative_distance, state = heapq.heappop(heap)
+            cur_distance = -negative_distance
+            if cur_distance > g_distance[state]:
+                continue
+            if state == end:
+                nodes = [end]
+                while nodes[-1] != start:
+                    nodes.append(parent[nodes[-1]])
+                return cur_distance, tuple(reversed(nodes))
+
+            for next_state, edge_cost in self.__get_edges(state, end):
+                if next_state not in g_distance or g_distance[next_state] > cur_distance + edge_cost:
+                    g_distance[next_state] = cur_distance + edge_cost
+                    parent[next_state] = state
+                    heuristic = 0 if next_state == end else HPA_HEURISTIC_WEIGHT * get_heuristic(next_state, end) + entry_excess
+                    heapq.heappush(heap, (cur_distance + edge_cost + heuristic, -(cur_distance + edge_cost), next_state))
+
+        return None
+
+    def refine(self, nodes) -> Tuple[int, List[Tuple]]:
+        """Search for the cheapest path along an abstract path through the clusters it passes through and those
+        around them. Unlike the abstract path, it may turn across cluster borders and cross them anywhere
+
+        Args:
+            nodes (Tuple): abstract path returned by search
+
+        Returns:
+            Tuple: (cost, list of (x, y, direction) states from start to end)
+        """
+        start, end = nodes[0], nodes[-1]
+        corridor = set()
+        for state in nodes:
+            cluster_x, cluster_y = self.__get_cluster(state)
+            for dx in range(-HPA_CORRIDOR_WIDTH, HPA_CORRIDOR_WIDTH + 1):
+                for dy in range(-HPA_CORRIDOR_WIDTH, HPA_CORRIDOR_WIDTH + 1):
+                    corridor.add((cluster_x + dx, cluster_y + dy))
+
+        g_distance = {start: 0}
+        cell_parent = dict()
+        heap = [(get_heuristic(start, end), 0, start)]
+        while heap:
+            _, negative_distance, state = heapq.heappop(heap)
+            cur_distance = -negative_distance
+            if cur_distance > g_distance[state]:
+                continue
+            if state == end:
+                break
+
+            for x, y, direction, move_cost in self.__get_moves(state):
+                next_state = (x, y, direction)
+                if self.__get_cluster(next_state) not in corridor:
+                    continue
+                if next_state not in g_distance or g_distance[next_state] > cur_distance + move_cost:
+                    g_distance[next_state] = cur_distance + move_cost
+                    cell_parent[next_state] = state
+                    heapq.heappush(heap, (cur_distance + move_cost + get_heuristic(next_state, end), -(cur_distance + move_cost), next_state))
+
+        states = [end]
+        while states[-1] != start:
+            states.append(cell_parent[states[-1]])
+        states.reverse()
+        return g_distance[end], states
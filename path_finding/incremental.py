@@ -0,0 +1,230 @@
+import heapq
+import math
+from typing import Callable, Iterable, Optional, Tuple
+
+from consts import INCREMENTAL_REBUILD_DISTANCE, VIRTUAL_CELLS
+from direction import Direction
+
+from .path_library import PADDING
+
+DIRECTIONS = (Direction.NORTH, Direction.EAST, Direction.SOUTH, Direction.WEST)
+
+
+class ShortestPathTree:
+    """
+    Costs from one start state to every state of the arena, kept up to date as move costs change
+
+    The tree is built with Dijkstra's algorithm, then repaired by LPA* whenever moves change: each state keeps its cost
+    g and a one-step lookahead rhs, the cheapest g of a predecessor plus the move from it, and only the states where
+    the two disagree are expanded again. A tree has no single goal, so the heuristic is zero and the repair runs until
+    every state is consistent, which for a local change only touches the states whose cost actually changes.
+    """
+    def __init__(self, start: Tuple, successors: dict, predecessors: dict):
+        """
+        Args:
+            start (Tuple): (x, y, direction) start state
+            successors (dict): moves out of each state, as {state: {next state: move cost}}
+            predecessors (dict): moves into each state, as {state: {previous state: move cost}}
+        """
+        self.start = start
+        self.successors = successors
+        self.predecessors = predecessors
+        self.build()
+
+    def build(self):
+        """Search the whole tree from scratch with Dijkstra's algorithm"""
+        # States missing from g and rhs cost infinity
+        self.g = {self.start: 0}
+        queue = [(0, self.start)]
+        while queue:
+            cost, state = heapq.heappop(queue)
+            if cost > self.g[state]:
+                continue
+            for next_state, move_cost in self.successors[state].items():
+                if cost + move_cost < self.g.get(next_state, math.inf):
+                    self.g[next_state] = cost + move_cost
+                    heapq.heappush(queue, (cost + move_cost, next_state))
+        self.rhs = dict(self.g)
+        self.queue = []
+
+    def __get_lookahead(self, state) -> float:
+        return min((self.g.get(previous, math.inf) + cost for previous, cost in self.predecessors[state].items()), default=math.inf)
+
+    def __set_rhs(self, state, rhs):
+        if rhs == math.inf:
+            self.rhs.pop(state, None)
+        else:
+            self.rhs[state] = rhs
+        g = self.g.get(state, math.inf)
+        if g != rhs:
+            heapq.heappush(self.queue, (min(g, rhs), state))
+
+    def update(self, changes: Iterable[Tuple]):
+        """Repair the tree after moves changed
+
+        Args:
+            changes (Iterable[Tuple]): (state, next state, old cost, new cost) of each changed move, costing infinity
+                where the move did not or no longer exists
+        """
+        for state, next_state, old_cost, new_cost in changes:
+            g = self.g.get(state, math.inf)
+            if next_state == self.start or g == math.inf:
+                continue
+            rhs = self.rhs.get(next_state, math.inf)
+            if g + new_cost < rhs:
+                self.__set_rhs(next_state, g + new_cost)
+            elif new_cost > old_cost and g + old_cost == rhs:
+                # The move was the cheapest way into next_state, which has to look for another
+                self.__set_rhs(next_state, self.__get_lookahead(next_state))
+
+        while self.queue:
+            key, state = heapq.heappop(self.queue)
+            g, rhs = self.g.get(state, math.inf), self.rhs.get(state, math.inf)
+            # Skip entries left behind by a later update of the same state
+            if g == rhs or key != min(g, rhs):
+                continue
+
+
+            if g > rhs:
+                # Overconsistent: the state got cheaper, settle it and offer the saving to its successors
+                self.g[state] = rhs
+                for next_state, move_cost in self.successors[state].items():
+                    if next_state != self.start and rhs + move_cost < self.rhs.get(next_state, math.inf):
+                        self.__set_rhs(next_state, rhs + move_cost)
+            else:
+                # Underconsistent: the state got dearer, unsettle it and let the successors that relied on it look again
+                del self.g[state]
+                self.__set_rhs(state, rhs)
+                for next_state, move_cost in self.successors[state].items():
+                    if next_state != self.start and g + move_cost == self.rhs.get(next_state, math.inf):
+                        self.__set_rhs(next_state, self.__get_lookahead(next_state))
+
+    def get_path(self, end: Tuple) -> Optional[Tuple]:
+        """Cheapest path from the start state to end, read back along the predecessors that give each state its cost
+
+        Args:
+            end (Tuple): (x, y, direction) end state
+
+        Returns:
+            Optional[Tuple]: (cost, list of (x, y, direction) states from start to end), None if end is unreachable
+        """
+        cost = self.g.get(end)
+        if cost is None:
+            return None
+
+        path = [end]
+        state = end
+        while state != self.start:
+            g = self.g[state]
+            state = next(
+                previous for previous, move_cost in self.predecessors[state].items()
+                if self.g.get(previous, math.inf) + move_cost == g
+            )
+            path.append(state)
+        path.reverse()
+        return cost, path
+
+
+class IncrementalSearch:
+    """
+    Search that can be repaired when obstacles are added, moved or removed, used to correct a plan mid-run
+
+    The moves out of every state of the arena are worked out once. Every leg of a plan starts at the robot's state or
+    at a viewing position, so a ShortestPathTree is kept per start state and legs are read off it. When obstacles
+    change, only the moves of the states near them are worked out again, and each tree is repaired by LPA* rather than
+    searched from scratch.
+    """
+    def __init__(self, arena, get_moves: Callable):
+        """
+        Args:
+            arena (Arena): Arena to search, whose obstacles are changed by the caller before calling update
+            get_moves (Callable): function of (x, y, direction) returning the moves out of that state as
+                (x, y, direction, move cost) tuples
+        """
+        self.arena = arena
+        self.get_moves = get_moves
+        self.successors = dict()
+        self.predecessors = {
+            (x, y, direction): dict()
+            for x in range(arena.arena_width) for y in range(arena.arena_height) for direction in DIRECTIONS
+        }
+        for state in self.predecessors:
+            self.__set_moves(state)
+        # Shortest path tree of each start state searched from so far, and the start states searched from since the
+        # last update
+        self.trees = dict()
+        self.used_trees = set()
+
+    def __set_moves(self, state) -> list:
+        """Work out the moves out of state again
+
+        Returns:
+            list: (state, next state, old cost, new cost) of each move that changed
+        """
+        moves = dict()
+        if self.arena.is_in_bounds(state[0], state[1]):
+            for next_x, next_y, new_direction, move_cost in self.get_moves(*state):
+                next_state = (next_x, next_y, new_direction)
+                moves[next_state] = min(move_cost, moves.get(next_state, math.inf))
+
+        old_moves = self.successors.get(state, dict())
+        self.successors[state] = moves
+        changes = []
+        for next_state in old_moves.keys() | moves.keys():
+            old_cost, new_cost = old_moves.get(next_state, math.inf), moves.get(next_state, math.inf)
+            if old_cost != new_cost:
+                changes.append((state, next_state, old_cost, new_cost))
+                if new_cost == math.inf:
+                    del self.predecessors[next_state][state]
+                else:
+                    self.predecessors[next_state][state] = new_cost
+        return changes
+
+    def search(self, start: Tuple, end: Tuple) -> Optional[Tuple]:
+        """Find the cheapest path from start to end on start's tree, growing the tree first if there is none yet
+
+        Args:
+            start (Tuple): (x, y, direction) start state
+            end (Tuple): (x, y, direction) end state
+
+        Returns:
+            Optional[Tuple]: (cost, list of (x, y, direction) states from start to end), None if end is unreachable
+        """
+        if start not in self.trees:
+            self.trees[start] = ShortestPathTree(start, self.successors, self.predecessors)
+        self.used_trees.add(start)
+        return self.trees[start].get_path(end)
+
+    def update(self, cells: Iterable[Tuple]) -> int:
+        """Work out the moves near the given cells again and repair every tree, after obstacles were added to or
+        removed from those cells
+
+        Args:
+            cells (Iterable[Tuple]): (x, y) cells whose obstacle changed
+
+        Returns:
+            int: number of moves that changed
+        """
+        cells = list(cells)
+        # Moves look up to PADDING cells away, where obstacles block or add a safe cost up to VIRTUAL_CELLS further
+        radius = PADDING + VIRTUAL_CELLS
+        states = {
+            (x, y, direction)
+            for cell_x, cell_y in cells
+            for x in range(max(cell_x - radius, 0), min(cell_x + radius + 1, self.arena.arena_width))
+            for y in range(max(cell_y - radius, 0), min(cell_y + radius + 1, self.arena.arena_height))
+            for direction in DIRECTIONS
+        }
+        changes = [change for state in sorted(states) for change in self.__set_moves(state)]
+
+        # Trees no leg was read off since the last update, such as those of states the robot has since left, are
+        # dropped rather than repaired
+        self.trees = {start: tree for start, tree in self.trees.items() if start in self.used_trees}
+        self.used_trees = set()
+        for start, tree in self.trees.items():
+            # Changes close to the start reach most of the tree, which then takes longer to repair than to search again
+            if any(max(abs(start[0] - x), abs(start[1] - y)) < INCREMENTAL_REBUILD_DISTANCE for x, y in cells):
+                tree.build()
+            else:
+                tree.update(changes)
+        return len(changes)
@@ -1,14 +1,24 @@
-import heapq
 import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import List
 
 import numpy as np
 from python_tsp.exact import solve_tsp_dynamic_programming
+from scipy.optimize import linear_sum_assignment
 
-from arena_objects import GridCell
-from consts import ITERATIONS, SAFE_COST, TURN_FACTOR, TURN_RADIUS
+from arena_objects import GridCell, Obstacle
+from consts import (HPA_MIN_ARENA_SIZE, HPA_REFINE_DISTANCE, ITERATIONS, PARALLEL_MIN_EDGES, PATH_LIBRARY_DIR, PATH_WORKERS,
+                    SAFE_COST, TURN_FACTOR, TURN_RADIUS)
 from direction import Direction
 
+from .hierarchical import HierarchicalSearch
+from .incremental import IncrementalSearch
+from .path_library import PathLibrary, get_arena_masks
+from .priority_queue import BucketQueue, HeapQueue
+
 movement_directions = [
     (1, 0, Direction.EAST),
     (-1, 0, Direction.WEST),
@@ -20,7 +30,11 @@ class PathFinder:
     def __init__(
             self,
             arena,
-            big_turn=None # the big_turn here is to allow 3-1 turn(0 - by default) | 4-2 turn(1)
+            big_turn=None, # the big_turn here is to allow 3-1 turn(0 - by default) | 4-2 turn(1)
+            path_library=None, # optional PathLibrary used in place of A* for legs that do not come near an obstacle
+            workers=PATH_WORKERS, # number of processes to run the A* searches on, 1 to search in this process
+            incremental=False, # keep the searches of the legs so that update_arena can repair them, small arenas only
+            trace=None # optional SearchTrace recording the states every A* search expands, searches in this process
     ):
         # Initialize a Arena object for the arena representation
         self.arena = arena
@@ -33,6 +47,59 @@ class PathFinder:
             self.big_turn = 0
         else:
             self.big_turn = int(big_turn)
+        # Number of edge worker processes, shared by every PathFinder through get_edge_pool
+        self.workers = workers
+        self.trace = trace
+        # Only use the path library if it was generated for an arena of this size
+        if path_library is not None and path_library.covers(arena.arena_width, arena.arena_height):
+            self.path_library = path_library
+        else:
+            self.path_library = None
+        # Move costs and the Manhattan heuristic are integers unless TURN_FACTOR or SAFE_COST are not, and integer
+        # priorities can be queued in buckets instead of a heap
+        self.queue_type = BucketQueue if isinstance(TURN_FACTOR, int) and isinstance(SAFE_COST, int) else HeapQueue
+        self.__set_obstacle_searches()
+        # Legs are read off shortest path trees that update_arena repairs, instead of being searched one by one
+        if incremental and self.hierarchical_search is None:
+            self.incremental_search = IncrementalSearch(arena, self.__get_moves)
+            self.path_library = None
+        else:
+            self.incremental_search = None
+
+    def __set_obstacle_searches(self):
+        """Set up the searches that depend on the arena's obstacles"""
+        if self.path_library is not None:
+            self.library_masks = get_arena_masks(self.arena.obstacles, self.arena.arena_width, self.arena.arena_height)
+        # Large arenas are searched over a cluster abstraction instead of the full lattice
+        if max(self.arena.arena_width, self.arena.arena_height) >= HPA_MIN_ARENA_SIZE:
+            self.hierarchical_search = HierarchicalSearch(self.arena, self.__get_moves)
+        else:
+            self.hierarchical_search = None
+
+    def update_arena(self, robot, obstacles: List[Obstacle]):
+        """Move the robot and replace the arena's obstacles, such as when an obstacle turns out to be missing or
+        misplaced mid-run. With incremental searches, only the moves near the obstacles that changed are worked out
+        again and the legs are repaired rather than searched again.
+
+        Args:
+            robot (Robot): Robot at its current state
+            obstacles (List[Obstacle]): All the obstacles of the arena
+        """
+        changed_cells = {(ob.x, ob.y) for ob in self.arena.obstacles} ^ {(ob.x, ob.y) for ob in obstacles}
+        self.arena.set_robot(robot)
+        self.arena.set_obstacles(list(obstacles))
+        self.robot = robot
+
+        # Legs do not depend on the robot, so the tables only have to be cleared if the obstacles moved
+        if not changed_cells:
+            return
+        if self.incremental_search is not None:
+            self.incremental_search.update(changed_cells)
+        else:
+            self.__set_obstacle_searches()
+        # Costs and paths of the old arena no longer hold, legs are looked up again as they are needed
+        self.path_table.clear()
+        self.cost_table.clear()
 
     def __calc_rotation_cost(self, d1, d2):
         diff = abs(d1 - d2)
@@ -90,12 +157,14 @@ class PathFinder:
         s.sort(key=lambda x: x.count('1'), reverse=True)
         return s
 
-    def get_shortest_path(self, retrying) -> List[GridCell]:
+    def get_shortest_path(self, retrying, view_positions: List[List[GridCell]] = None) -> List[GridCell]:
         '''
         Main Function to calculate the shortest path to go to all obstacles once
 
         Args:
             retrying (boolean): Whether or not the robot needs to retry
+            view_positions (List[List[GridCell]], optional): Viewing positions to choose from for each obstacle to
+                visit. Defaults to all the viewing positions of every obstacle in the arena.
 
         Returns:
             optimal_path (List):   List of paths for the robot to follow
@@ -105,7 +174,7 @@ class PathFinder:
         optimal_path = []
 
         # Get all possible positions that can view the obstacles
-        all_view_positions = self.arena.get_viewing_positions(retrying)
+        all_view_positions = self.arena.get_viewing_positions(retrying) if view_positions is None else view_positions
 
         for op in self.__get_binary_strings(len(all_view_positions)):
             # op is binary string of length len(all_view_positions) == len(obstacles)
@@ -122,54 +191,259 @@ class PathFinder:
                     cur_view_positions.append(all_view_positions[idx])
 
             self.__path_cost_generator(items)
-            combination = []
-            self.__generate_combination(cur_view_positions, 0, [], combination, [ITERATIONS])
-
-            for c in combination: # run the algo some times ->
-                visited_candidates = [0] # add the start state of the robot
-
-                cur_index = 1
-                fixed_cost = 0 # the cost applying for the position taking obstacle pictures
-                for index, view_position in enumerate(cur_view_positions):
-                    visited_candidates.append(cur_index + c[index])
-                    fixed_cost += view_position[c[index]].penalty
-                    cur_index += len(view_position)
-                
-                cost_np = np.zeros((len(visited_candidates), len(visited_candidates)))
-
-                for s in range(len(visited_candidates) - 1):
-                    for e in range(s + 1, len(visited_candidates)):
-                        u = items[visited_candidates[s]]
-                        v = items[visited_candidates[e]]
-                        if (u, v) in self.cost_table.keys():
-                            cost_np[s][e] = self.cost_table[(u, v)]
-                        else:
-                            cost_np[s][e] = 1e9
-                        cost_np[e][s] = cost_np[s][e]
-                cost_np[:, 0] = 0
-                _permutation, _distance = solve_tsp_dynamic_programming(cost_np)
-                if _distance + fixed_cost >= total_distance:
-                    continue
 
-                optimal_path = [items[0]]
-                total_distance = _distance + fixed_cost
+            # On large arenas, the long legs a tour has not taken yet are costed by their abstract paths, which refining
+            # them can only make cheaper. The tour is solved again with the refined costs until its legs keep their cost
+            tour = self.__solve_tour(items, cur_view_positions)
+            while tour is not None:
+                tour_items, fixed_cost, solved_distance = tour
+                optimal_path, total_distance = self.__build_path(tour_items, fixed_cost)
+                if total_distance >= solved_distance:
+                    break
+                tour = self.__solve_tour(items, cur_view_positions)
 
-                for i in range(len(_permutation) - 1):
-                    from_item = items[visited_candidates[_permutation[i]]]
-                    to_item = items[visited_candidates[_permutation[i + 1]]]
+            if optimal_path:
+                # if found optimal path, return
+                break
 
-                    cur_path = self.path_table[(from_item, to_item)]
-                    for j in range(1, len(cur_path)):
-                        optimal_path.append(GridCell(cur_path[j][0], cur_path[j][1], cur_path[j][2]))
+        return optimal_path, total_distance
 
-                    optimal_path[-1].set_screenshot(to_item.screenshot_id)
+    def __solve_tour(self, items: List[GridCell], view_positions: List[List[GridCell]]):
+        """Pick a viewing position of every obstacle and the order to visit them in, over the costs in the cost table
 
-            if optimal_path:
-                # if found optimal path, return
+        Args:
+            items (List[GridCell]): the robot's start state followed by the viewing positions
+            view_positions (List[List[GridCell]]): viewing positions of each obstacle, in the order of the items
+
+        Returns:
+            Tuple: (states of the tour in the order they are visited, the robot's start state first, cost of stopping
+                at them, distance of the tour), or None if no combination of viewing positions can be visited
+        """
+        total_distance = 1e9
+        tour = None
+
+        # Costs between every pair of items, looked up once per subset; unreachable pairs cost 1e9
+        cost_matrix = np.array([[self.cost_table.get((u, v), 1e9) for v in items] for u in items])
+        np.fill_diagonal(cost_matrix, 0)
+        penalties = np.array([item.penalty for item in items])
+
+        # Drop the viewing positions a sibling does at least as well as, before enumerating the combinations
+        kept_groups = self.__prune_dominated_views(cost_matrix, penalties, view_positions)
+        kept = [0] + [index for group in kept_groups for index in group]
+        view_positions = [[items[index] for index in group] for group in kept_groups]
+        items = [items[index] for index in kept]
+        cost_matrix = cost_matrix[np.ix_(kept, kept)]
+        penalties = penalties[kept]
+
+        combination = []
+        self.__generate_combination(view_positions, 0, [], combination, [ITERATIONS])
+        if not combination:
+            return None
+
+        # Index into items of the states each combination visits, the robot's start state first
+        offsets = 1 + np.cumsum([0] + [len(view_position) for view_position in view_positions])[:-1]
+        visited_candidates = np.zeros((len(combination), len(view_positions) + 1), dtype=int)
+        visited_candidates[:, 1:] = offsets + np.array(combination, dtype=int).reshape(len(combination), -1)
+        # the cost applying for the position taking obstacle pictures
+        fixed_costs = penalties[visited_candidates[:, 1:]].sum(axis=1).tolist()
+
+        # Lower bound of each combination: every state but the start is entered exactly once, at best by its
+        # cheapest edge from another state of the combination
+        entry_costs = cost_matrix[visited_candidates[:, :, None], visited_candidates[:, None, :]]
+        entry_costs[:, np.arange(visited_candidates.shape[1]), np.arange(visited_candidates.shape[1])] = np.inf
+        lower_bounds = entry_costs[:, :, 1:].min(axis=1).sum(axis=1) + fixed_costs
+
+        # Solve the most promising combinations first, so that the rest can be skipped once their bound is no
+        # better than the best distance found
+        for k in np.argsort(lower_bounds, kind='stable'): # run the algo some times ->
+            if lower_bounds[k] >= total_distance:
                 break
-            
+
+            candidates, fixed_cost = visited_candidates[k], fixed_costs[k]
+            cost_np = cost_matrix[np.ix_(candidates, candidates)]
+            cost_np[:, 0] = 0
+            # The assignment relaxation gives a tighter bound, still far cheaper than the exact solve
+            if self.__get_assignment_bound(cost_np) + fixed_cost >= total_distance:
+                continue
+            _permutation, _distance = solve_tsp_dynamic_programming(cost_np)
+            if _distance + fixed_cost >= total_distance:
+                continue
+
+            total_distance = _distance + fixed_cost
+            tour = ([items[candidates[index]] for index in _permutation], fixed_cost, total_distance)
+
+        return tour
+
+    def __build_path(self, tour: List[GridCell], fixed_cost):
+        """Join the paths of the legs of a tour
+
+        Args:
+            tour (List[GridCell]): states of the tour in the order they are visited, the robot's start state first
+            fixed_cost: cost of stopping at the states of the tour
+
+        Returns:
+            optimal_path (List):   List of paths for the robot to follow
+            total_distance (float):   Total Distance required to travel in units
+        """
+        optimal_path = [tour[0]]
+        total_distance = fixed_cost
+
+        for from_item, to_item in zip(tour, tour[1:]):
+            cur_path = self.__get_path(from_item, to_item)
+            # Taken after __get_path, which may have refined the leg to a lower cost than the tour was solved with
+            total_distance += float(self.cost_table[(from_item, to_item)])
+            for j in range(1, len(cur_path)):
+                optimal_path.append(GridCell(cur_path[j][0], cur_path[j][1], cur_path[j][2]))
+            # Obstacles viewed from the state the robot already stopped at, such as two ids at the same pose,
+            # each get a stop of their own there rather than overwriting its screenshot
+            if len(cur_path) == 1 and optimal_path[-1].screenshot_id != -1:
+                optimal_path.append(GridCell(cur_path[0][0], cur_path[0][1], cur_path[0][2]))
+
+            optimal_path[-1].set_screenshot(to_item.screenshot_id)
+
         return optimal_path, total_distance
 
+    def get_first_leg(self, retrying, view_positions: List[List[GridCell]] = None):
+        '''
+        Quickly pick the first obstacle to photograph, so that the robot can set off while the rest of the tour is
+        planned by get_shortest_path
+
+        Each viewing position is tried as the first stop, the rest of the tour being estimated by going on to the
+        nearest viewing position of an obstacle not photographed yet until none is left. The first leg of the cheapest
+        estimate is committed, estimates photographing more obstacles coming first as they do in get_shortest_path.
+
+        Args:
+            retrying (boolean): Whether or not the robot needs to retry
+            view_positions (List[List[GridCell]], optional): Viewing positions to choose from for each obstacle to
+                visit. Defaults to all the viewing positions of every obstacle in the arena.
+
+        Returns:
+            first_leg (List):   List of paths for the robot to follow to the first obstacle, empty if none is reachable
+            distance (int):   Distance of the first leg in units
+        '''
+        all_view_positions = self.arena.get_viewing_positions(retrying) if view_positions is None else view_positions
+        items = [self.robot.get_robot_cell()] + [view for views in all_view_positions for view in views]
+        # Obstacle of each item, -1 for the robot's start state
+        obstacles = np.array([-1] + [index for index, views in enumerate(all_view_positions) for _ in views])
+
+        self.__path_cost_generator(items)
+
+        cost_matrix = np.array([[self.cost_table.get((u, v), 1e9) for v in items] for u in items])
+        # Stopping at an item costs the leg there plus the item's penalty
+        stop_costs = cost_matrix + np.array([item.penalty for item in items])[None, :]
+
+        best_estimate, best_first = None, None
+        for first in range(1, len(items)):
+            if cost_matrix[0, first] >= 1e9:
+                continue
+
+            visited = obstacles == obstacles[first]
+            visited[0] = True
+            current, cost, stops = first, stop_costs[0, first], 1
+            while not visited.all():
+                costs = np.where(visited, np.inf, stop_costs[current])
+                current = int(costs.argmin())
+                if costs[current] >= 1e9:
+                    break
+                cost += costs[current]
+                stops += 1
+                visited |= obstacles == obstacles[current]
+
+            if best_estimate is None or (-stops, cost) < best_estimate:
+                best_estimate, best_first = (-stops, cost), first
+
+        if best_first is None:
+            return [], 0
+
+        end = items[best_first]
+        first_leg = [items[0]] + [GridCell(x, y, direction) for x, y, direction in self.__get_path(items[0], end)[1:]]
+        first_leg[-1].set_screenshot(end.screenshot_id)
+        # Looked up after __get_path, which may have refined the leg to a lower cost
+        return first_leg, float(self.cost_table[(items[0], end)] + end.penalty)
+
+    def __get_assignment_bound(self, cost_np):
+        """Lower bound of the tour cost over cost_np from the assignment relaxation: every state is given a successor,
+        the start state included at no cost, without requiring the successors to form a single tour
+
+        Args:
+            cost_np (np.ndarray): costs between the states of a combination, the start state first
+
+        Returns:
+            float: lower bound of the cost of the cheapest tour
+        """
+        if len(cost_np) < 2:
+            return 0
+
+        costs = cost_np.copy()
+        np.fill_diagonal(costs, np.inf)
+        rows, cols = linear_sum_assignment(costs)
+        return costs[rows, cols].sum()
+
+    def __prune_dominated_views(self, cost_matrix, penalties, view_positions):
+        """Find the viewing positions of each obstacle that no other viewing position of the same obstacle dominates
+
+        A position is dominated by a sibling whose penalty and costs to every item outside the obstacle, the robot's
+        start state included, are no higher: swapping the sibling into any tour through the position never costs more,
+        so dropping the position loses no optimal tour. Of positions that dominate each other, the first is kept.
+
+        Args:
+            cost_matrix (np.ndarray): costs between the items, the robot's start state followed by the viewing positions
+            penalties (np.ndarray): penalty of each item
+            view_positions (List[List[GridCell]]): viewing positions of each obstacle, in the order of the items
+
+        Returns:
+            List[List[int]]: for each obstacle, the indices into the items of the viewing positions kept
+        """
+        kept_groups = []
+        index = 1
+        for view_position in view_positions:
+            group = np.arange(index, index + len(view_position))
+            index += len(view_position)
+
+            outside = np.ones(len(cost_matrix), dtype=bool)
+            outside[group] = False
+            costs = cost_matrix[group][:, outside]
+            # dominates[a, b]: position b is at least as good as position a
+            dominates = (costs[None, :, :] <= costs[:, None, :]).all(axis=2) & (penalties[group][None, :] <= penalties[group][:, None])
+            # a is dropped if some b dominates it strictly, or equally and comes first
+            drop = dominates & (~dominates.T | np.tri(len(group), k=-1, dtype=bool))
+            kept_groups.append(group[~drop.any(axis=1)].tolist())
+
+        return kept_groups
+
+    def __get_path(self, start: GridCell, end: GridCell):
+        """Rebuild the full list of (x, y, direction) states from start to end from the run-length encoded
+        move sequence stored in the path table
+
+        Args:
+            start (GridCell): Start cell state
+            end (GridCell): End cell state
+
+        Returns:
+            List: list of (x, y, direction) tuples from start to end
+        """
+        reverse = (start, end) not in self.path_table
+        key = (end, start) if reverse else (start, end)
+        origin, runs = self.path_table[key]
+        if origin is None:
+            # Abstract path of a long leg of the hierarchical search, refined now that a tour takes it. The tables are
+            # updated with the refined path and its cost, which is never higher
+            cost, states = self.hierarchical_search.refine(runs)
+            self.__record_path(*key, {states[k + 1]: states[k] for k in range(len(states) - 1)}, cost)
+            origin, runs = self.path_table[key]
+
+        x, y, _ = origin
+        path = [origin]
+        for dx, dy, new_direction, count in runs:
+            for _ in range(count):
+                x += dx
+                y += dy
+                path.append((x, y, new_direction))
+
+        if reverse:
+            path.reverse()
+        return path
+
     def __generate_combination(self, view_positions, index, current, result, iterations_left):
         if index == len(view_positions):
             result.append(current[:])
@@ -424,90 +698,277 @@ class PathFinder:
                                     neighbors.append((reverse_x, reverse_y, new_orientation, safe_cost + 20))
         return neighbors
 
-    def __path_cost_generator(self, states: List[GridCell]):
-        """Generate the path cost between the input states and update the tables accordingly
+    def __get_moves(self, x, y, orientation):
+        """
+        Return a list of tuples with format:
+        newX, newY, new_direction, move cost
+        """
+        return [
+            (next_x, next_y, new_direction, self.__calc_rotation_cost(new_direction, orientation) * TURN_FACTOR + 1 + safe_cost)
+            for next_x, next_y, new_direction, safe_cost in self.__get_neighbors(x, y, orientation)
+        ]
+
+    def __record_path(self, start: GridCell, end: GridCell, parent: dict, cost: int):
+        """Record the cost and path found between start and end in the tables
 
         Args:
-            states (List[GridCell]): cell states to visit
+            start (GridCell): Start cell state
+            end (GridCell): End cell state
+            parent (dict): parent state of each state on the path, as built by __astar_search
+            cost (int): cost of the path
         """
-        def __record_path(start, end, parent: dict, cost: int):
+        # Update cost table for the (start,end) and (end,start) edges
+        self.cost_table[(start, end)] = cost
+        self.cost_table[(end, start)] = cost
 
-            # Update cost table for the (start,end) and (end,start) edges
-            self.cost_table[(start, end)] = cost
-            self.cost_table[(end, start)] = cost
+        # Walk the parent chain back from the end state, run-length encoding the moves as (dx, dy, new direction, count)
+        # Only the (start,end) edge is stored, the (end,start) path is rebuilt in reverse by __get_path when needed
+        runs = []
+        cursor = (end.x, end.y, end.direction)
 
-            path = []
-            cursor = (end.x, end.y, end.direction)
+        while cursor in parent:
+            previous = parent[cursor]
+            move = (cursor[0] - previous[0], cursor[1] - previous[1], cursor[2])
+            if runs and runs[-1][:3] == move:
+                runs[-1][3] += 1
+            else:
+                runs.append([*move, 1])
+            cursor = previous
 
-            while cursor in parent:
-                path.append(cursor)
-                cursor = parent[cursor]
+        self.path_table[(start, end)] = (cursor, tuple(tuple(run) for run in reversed(runs)))
 
-            path.append(cursor)
+    def __astar_search(self, start: GridCell, end: GridCell):
+        """Search for the cheapest path from start to end and record it in the tables, if there is one
 
-            # Update path table for the (start,end) and (end,start) edges, with the (start,end) edge being the reversed path
-            self.path_table[(start, end)] = path[::-1]
-            self.path_table[(end, start)] = path
+        Args:
+            start (GridCell): Start cell state
+            end (GridCell): End cell state
+        """
+        dist_between = self.__compute_distance_between(start, end)
+
+        # If it is already done before, return
+        if (start, end) in self.path_table or (end, start) in self.path_table:
+            return
 
-        def __astar_search(start: GridCell, end: GridCell):
+        # If the legs are kept up to date incrementally, read this one off the start state's tree
+        if self.incremental_search is not None:
+            incremental_path = self.incremental_search.search((start.x, start.y, start.direction), (end.x, end.y, end.direction))
+            if incremental_path is not None:
+                cost, states = incremental_path
+                self.__record_path(start, end, {states[k + 1]: states[k] for k in range(len(states) - 1)}, cost)
+            return
 
-            dist_between = self.__compute_distance_between(start, end)
+        # If the leg can be taken straight from the path library, skip the search
+        if self.path_library is not None:
+            library_path = self.path_library.get_path(start, end, self.library_masks)
+            if library_path is not None:
+                cost, states = library_path
+                self.__record_path(start, end, {states[k + 1]: states[k] for k in range(len(states) - 1)}, cost)
+                return
 
-            # If it is already done before, return
-            if (start, end) in self.path_table:
+        # On large arenas, search the cluster abstraction. Short legs are refined cell by cell straight away, as their
+        # abstract costs are the least accurate and refining them is cheap. Long legs keep their abstract path in the
+        # path table under a None origin, refined by __get_path only if a tour takes the leg
+        if self.hierarchical_search is not None:
+            start_state, end_state = (start.x, start.y, start.direction), (end.x, end.y, end.direction)
+            hierarchical_path = self.hierarchical_search.search(start_state, end_state)
+            if hierarchical_path is None:
                 return
+            cost, nodes = hierarchical_path
+            if self.hierarchical_search.get_cluster_distance(start_state, end_state) <= HPA_REFINE_DISTANCE:
+                cost, states = self.hierarchical_search.refine(nodes)
+                self.__record_path(start, end, {states[k + 1]: states[k] for k in range(len(states) - 1)}, cost)
+                return
+            self.cost_table[(start, end)] = cost
+            self.cost_table[(end, start)] = cost
+            self.path_table[(start, end)] = (None, nodes)
+            return
 
-            # Heuristic to guide the search: 'distance' is calculated by f = g + h
-            # g is the actual distance moved so far from the start node to current node
-            # h is the heuristic distance from current node to end node
-            g_distance = {(start.x, start.y, start.direction): 0}
+        # Heuristic to guide the search: 'distance' is calculated by f = g + h
+        # g is the actual distance moved so far from the start node to current node
+        # h is the heuristic distance from current node to end node
+        g_distance = {(start.x, start.y, start.direction): 0}
+
+        # format of each item in queue: f_distance of node, (x coord of node, y coord of node, direction of node)
+        # the queue pops the smallest f_distance first
+        queue = self.queue_type()
+        queue.push(dist_between, (start.x, start.y, start.direction))
+        parent = dict()
+        visited = set()
+        trace = self.trace
+        if trace is not None:
+            trace.start_leg(start, end)
+
+        while queue:
+            # Pop the node with the smallest distance
+            f_distance, (cur_x, cur_y, cur_direction) = queue.pop()
+            
+            # Skip if the node has already been explored
+            if (cur_x, cur_y, cur_direction) in visited:
+                continue
+            if trace is not None:
+                trace.expand(cur_x, cur_y, cur_direction, g_distance[(cur_x, cur_y, cur_direction)], f_distance, len(queue))
+
+            # Goal testing, checking if popped node is the goal node
+            if end.is_equal(cur_x, cur_y, cur_direction):
+                self.__record_path(start, end, parent, g_distance[(cur_x, cur_y, cur_direction)])
+                if trace is not None:
+                    trace.end_leg(g_distance[(cur_x, cur_y, cur_direction)])
+                return
 
-            # format of each item in heap: (f_distance of node, x coord of node, y coord of node)
-            # heap in Python is a min-heap
-            heap = [(dist_between, start.x, start.y, start.direction)]
-            parent = dict()
-            visited = set()
+            visited.add((cur_x, cur_y, cur_direction))
+            cur_distance = g_distance[(cur_x, cur_y, cur_direction)]
 
-            while heap:
-                # Pop the node with the smallest distance
-                _, cur_x, cur_y, cur_direction = heapq.heappop(heap)
-                
-                # Skip if the node has already been explored
-                if (cur_x, cur_y, cur_direction) in visited:
+            for next_x, next_y, new_direction, move_cost in self.__get_moves(cur_x, cur_y, cur_direction):
+                if (next_x, next_y, new_direction) in visited:
                     continue
 
-                # Goal testing, checking if popped node is the goal node
-                if end.is_equal(cur_x, cur_y, cur_direction):
-                    __record_path(start, end, parent, g_distance[(cur_x, cur_y, cur_direction)])
-                    return
+                # the cost to check if any obstacles that considered too near the robot; if it
+                # safe_cost =
 
-                visited.add((cur_x, cur_y, cur_direction))
-                cur_distance = g_distance[(cur_x, cur_y, cur_direction)]
+                # new cost is calculated by the cost to reach current state + cost to move from
+                # current state to new state + heuristic cost from new state to end state
+                next_cost = \
+                    cur_distance + \
+                    move_cost + \
+                    self.__compute_distance_between(x1 = next_x, y1 = next_y, x2 = end.x, y2 = end.y)
 
-                for next_x, next_y, new_direction, safe_cost in self.__get_neighbors(cur_x, cur_y, cur_direction):
-                    if (next_x, next_y, new_direction) in visited:
-                        continue
+                if (next_x, next_y, new_direction) not in g_distance or \
+                        g_distance[(next_x, next_y, new_direction)] > cur_distance + move_cost:
+                    g_distance[(next_x, next_y, new_direction)] = cur_distance + move_cost
+                    parent[(next_x, next_y, new_direction)] = (cur_x, cur_y, cur_direction)
 
-                    move_cost = self.__calc_rotation_cost(new_direction, cur_direction) * TURN_FACTOR + 1 + safe_cost
+                    queue.push(next_cost, (next_x, next_y, new_direction))
 
-                    # the cost to check if any obstacles that considered too near the robot; if it
-                    # safe_cost =
+    def search_edges(self, start: GridCell, ends: List[GridCell]):
+        """Search the paths from one start state to several end states, used by the edge worker processes
 
-                    # new cost is calculated by the cost to reach current state + cost to move from
-                    # current state to new state + heuristic cost from new state to end state
-                    next_cost = \
-                        cur_distance + \
-                        move_cost + \
-                        self.__compute_distance_between(x1 = next_x, y1 = next_y, x2 = end.x, y2 = end.y)
+        Args:
+            start (GridCell): Start cell state
+            ends (List[GridCell]): End cell states
 
-                    if (next_x, next_y, new_direction) not in g_distance or \
-                            g_distance[(next_x, next_y, new_direction)] > cur_distance + move_cost:
-                        g_distance[(next_x, next_y, new_direction)] = cur_distance + move_cost
-                        parent[(next_x, next_y, new_direction)] = (cur_x, cur_y, cur_direction)
+        Returns:
+            List: (cost, path table entry, whether the entry runs from end to start) for each end state, or None where
+                there is no path
+        """
+        results = []
+        for end in ends:
+            self.__astar_search(start, end)
+            # A worker reused across plans may already hold the leg the other way round, from when end was a start
+            if (start, end) in self.path_table:
+                results.append((self.cost_table[(start, end)], self.path_table[(start, end)], False))
+            elif (end, start) in self.path_table:
+                results.append((self.cost_table[(end, start)], self.path_table[(end, start)], True))
+            else:
+                results.append(None)
+        return results
+
+    def __path_cost_generator(self, states: List[GridCell]):
+        """Generate the path cost between the input states and update the tables accordingly
+
+        Args:
+            states (List[GridCell]): cell states to visit
+        """
+        # Collect the state pairings that have not been searched before
+        pairs = [
+            (i, j) for i in range(len(states) - 1) for j in range(i + 1, len(states))
+            if (states[i], states[j]) not in self.path_table and (states[j], states[i]) not in self.path_table
+        ]
+
+        # Searches are independent given the arena, so split them by start state across the worker pool if worthwhile,
+        # unless they are read off incremental trees or traced in this process
+        if self.workers > 1 and len(pairs) >= PARALLEL_MIN_EDGES and self.incremental_search is None and self.trace is None:
+            try:
+                self.__parallel_path_cost_generator(states, pairs)
+                return
+            except BrokenProcessPool:
+                # A worker died, search in this process and let the next plan start a new pool
+                reset_edge_pool()
 
-                        heapq.heappush(heap, (next_cost, next_x, next_y, new_direction))
-                
         # Nested loop through all the state pairings
-        for i in range(len(states) - 1):
-            for j in range(i + 1, len(states)):
-                __astar_search(states[i], states[j])
\ No newline at end of file
+        for i, j in pairs:
+            self.__astar_search(states[i], states[j])
+
+    def __parallel_path_cost_generator(self, states: List[GridCell], pairs):
+        """Run the searches for the given state pairings on the edge worker pool and merge the results into the tables
+
+        Args:
+            states (List[GridCell]): cell states to visit
+            pairs (List): (i, j) indices into states of the pairings to search
+        """
+        ends_by_start = dict()
+        for i, j in pairs:
+            ends_by_start.setdefault(i, []).append(j)
+
+        # The workers outlive this PathFinder, so every task carries the arena it is searched over
+        use_library = self.path_library is not None
+        tasks = [(self.arena, use_library, states[i], [states[j] for j in ends]) for i, ends in ends_by_start.items()]
+        edge_pool = get_edge_pool(self.workers)
+        for (i, ends), results in zip(ends_by_start.items(), edge_pool.map(search_edges, tasks)):
+            for j, result in zip(ends, results):
+                if result is None:
+                    continue
+                cost, path_entry, reverse = result
+                self.cost_table[(states[i], states[j])] = cost
+                self.cost_table[(states[j], states[i])] = cost
+                self.path_table[(states[j], states[i]) if reverse else (states[i], states[j])] = path_entry
+
+
+# Pool of edge worker processes shared by every PathFinder of this process, started on first use and kept running, so
+# that plans do not pay for starting processes
+edge_pool = None
+edge_pool_lock = threading.Lock()
+
+
+def get_edge_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the edge worker pool, starting it with the given number of workers if it is not running yet
+
+    The workers are spawned rather than forked, as the server forking them already runs inference, reaper and other
+    threads whose locks a forked child could inherit in a held state.
+    """
+    global edge_pool
+    with edge_pool_lock:
+        if edge_pool is None:
+            edge_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_edge_worker,
+            )
+        return edge_pool
+
+
+def reset_edge_pool():
+    """Shut down the edge worker pool, such as after a worker died, so that the next plan starts a new one"""
+    global edge_pool
+    with edge_pool_lock:
+        if edge_pool is not None:
+            edge_pool.shutdown(wait=False, cancel_futures=True)
+            edge_pool = None
+
+
+# Path library of the current edge worker process, loaded once by init_edge_worker
+edge_worker_path_library = None
+# PathFinder of the current edge worker process for the last layout it searched, as (layout key, PathFinder), so that
+# the searches of one plan spread over several tasks share their tables
+edge_worker_path_finder = (None, None)
+
+
+def init_edge_worker():
+    """Initializer of the edge worker processes, memory-maps the path library if it has been generated"""
+    global edge_worker_path_library
+    edge_worker_path_library = PathLibrary.load(PATH_LIBRARY_DIR)
+
+
+def search_edges(task):
+    """Entry point of the edge worker processes, task is an (arena, use the path library, start state, list of end
+    states) tuple"""
+    global edge_worker_path_finder
+    arena, use_library, start, ends = task
+    key = (
+        arena.arena_width, arena.arena_height, use_library,
+        tuple(sorted((ob.x, ob.y, int(ob.direction)) for ob in arena.get_obstacles())),
+    )
+    if edge_worker_path_finder[0] != key:
+        path_library = edge_worker_path_library if use_library else None
+        edge_worker_path_finder = (key, PathFinder(arena, path_library=path_library, workers=1))
+    return edge_worker_path_finder[1].search_edges(start, ends)
@@ -0,0 +1,239 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+from consts import GRID_HEIGHT, GRID_WIDTH, PATH_LIBRARY_DIR, TURN_FACTOR, TURN_RADIUS
+from direction import Direction
+
+# Modes of the reachability checks a move depends on, indexing the first axis of the arena masks
+PLAIN, TURN, ALWAYS, NEVER = 0, 1, 2, 3
+# Index of the mask of cells with a zero safe cost
+SAFE = 4
+
+BIGGER_CHANGE = max(TURN_RADIUS)
+SMALLER_CHANGE = min(TURN_RADIUS)
+# Largest offset from the source cell that any check looks at
+PADDING = BIGGER_CHANGE + 1
+
+
+def build_move_checks():
+    """Mirror of PathFinder.__get_neighbors: for every move (from direction, to direction, dx, dy), the list of
+    (mode, dx, dy) cells relative to the source that must be reachable for the move to be generated
+    """
+    b, s = BIGGER_CHANGE, SMALLER_CHANGE
+    checks = {}
+
+    # Straight moves only need the destination to be reachable
+    for direction, (ux, uy) in ((Direction.NORTH, (0, 1)), (Direction.EAST, (1, 0)), (Direction.SOUTH, (0, -1)), (Direction.WEST, (-1, 0))):
+        checks[(direction, direction, ux, uy)] = [(PLAIN, ux, uy)]
+        checks[(direction, direction, -ux, -uy)] = [(PLAIN, -ux, -uy)]
+
+    # Turns need the source to be safe to turn from, plus the cells swept by the turn
+    turns = {
+        (Direction.NORTH, Direction.EAST, b, s): [(TURN, b + 1, s), (PLAIN, 0, s)],                  # FR00
+        (Direction.NORTH, Direction.EAST, -b, -s): [(TURN, -b, -s), (PLAIN, 0, -s), (PLAIN, 0, 1)],  # BL00
+        (Direction.NORTH, Direction.WEST, -b, s): [(TURN, -b - 1, s), (PLAIN, 0, s)],                # FL00
+        (Direction.NORTH, Direction.WEST, b, -s): [(TURN, b, -s), (PLAIN, 0, -s), (PLAIN, 0, 1)],    # BR00
+        (Direction.EAST, Direction.NORTH, s, b): [(TURN, s, b + 1), (PLAIN, s, 0)],                  # FL00
+        (Direction.EAST, Direction.NORTH, -s, -b): [(TURN, -s, -b), (PLAIN, -s, 0), (PLAIN, 1, 0)],  # BR00
+        (Direction.EAST, Direction.SOUTH, s, -b): [(TURN, s, -b - 1), (PLAIN, s, 0)],                # FR00
+        (Direction.EAST, Direction.SOUTH, -s, b): [(TURN, -s, b), (PLAIN, -s, 0), (PLAIN, 1, 0)],    # BL00
+        (Direction.SOUTH, Direction.EAST, b, -s): [(TURN, b + 1, -s), (PLAIN, 0, -s)],               # FL00
+        (Direction.SOUTH, Direction.EAST, -b, s): [(TURN, -b, s), (PLAIN, 0, s), (PLAIN, 0, -1)],    # BR00
+        (Direction.SOUTH, Direction.WEST, -b, -s): [(TURN, -b - 1, -s), (PLAIN, 0, -s)],             # FR00
+        (Direction.SOUTH, Direction.WEST, b, s): [(TURN, b, s), (PLAIN, 0, s), (PLAIN, 0, -1)],      # BL00
+        (Direction.WEST, Direction.SOUTH, -s, -b): [(TURN, -s, -b - 1), (PLAIN, -s, 0)],             # FL00
+        (Direction.WEST, Direction.SOUTH, s, b): [(TURN, s, b), (PLAIN, s, 0), (PLAIN, -1, 0)],      # BR00
+        # WEST -> NORTH is never generated by PathFinder.__get_neighbors, so it is left out here as well
+    }
+    for move, cells in turns.items():
+        checks[move] = [(TURN, 0, 0)] + cells
+
+    return checks
+
+
+MOVE_CHECKS = build_move_checks()
+
+# Dense lookup of MOVE_CHECKS indexed by [from direction // 2, to direction // 2, dx + BIGGER_CHANGE, dy + BIGGER_CHANGE],
+# each entry padded to the same number of (mode, dx, dy) checks; unknown moves always fail
+MAX_CHECKS = max(len(cells) for cells in MOVE_CHECKS.values())
+CHECK_TABLE = np.zeros((4, 4, 2 * BIGGER_CHANGE + 1, 2 * BIGGER_CHANGE + 1, MAX_CHECKS, 3), dtype=np.int8)
+CHECK_TABLE[..., 0] = NEVER
+for (from_direction, to_direction, dx, dy), cells in MOVE_CHECKS.items():
+    entry = CHECK_TABLE[from_direction // 2, to_direction // 2, dx + BIGGER_CHANGE, dy + BIGGER_CHANGE]
+    entry[:, 0] = ALWAYS
+    entry[:len(cells)] = cells
+
+
+def get_move_cost(from_direction: int, to_direction: int) -> int:
+    """Cost of a move on the empty lattice, matching the move_cost used by PathFinder's A* search with a zero safe cost"""
+    if from_direction == to_direction:
+        return 1
+    diff = abs(from_direction - to_direction)
+    return min(diff, 8 - diff) * TURN_FACTOR + 1 + 10
+
+
+def get_arena_masks(obstacles, arena_width: int, arena_height: int) -> np.ndarray:
+    """Rasterise the obstacles into the reachability masks used to validate library paths
+
+    Args:
+        obstacles (List[Obstacle]): obstacles in the arena
+        arena_width (int): Size of the arena in the x direction
+        arena_height (int): Size of the arena in the y direction
+
+    Returns:
+        np.ndarray: (5, width + 2 * PADDING, height + 2 * PADDING) boolean array holding, in order, the PLAIN, TURN,
+            ALWAYS and NEVER masks of Arena.is_reachable plus a mask of cells with a zero safe cost
+    """
+    masks = np.zeros((5, arena_width + 2 * PADDING, arena_height + 2 * PADDING), dtype=bool)
+    in_bounds = np.zeros_like(masks[0])
+    in_bounds[PADDING + 1:PADDING + arena_width - 1, PADDING + 1:PADDING + arena_height - 1] = True
+
+    blocked_plain = np.zeros_like(in_bounds)
+    blocked_turn = np.zeros_like(in_bounds)
+    unsafe = np.zeros_like(in_bounds)
+    for ob in obstacles:
+        x, y = ob.x + PADDING, ob.y + PADDING
+        # Obstacles within the 3x3 box block plain moves, obstacles within 2 units (x+y) block turns
+        blocked_plain[x - 1:x + 2, y - 1:y + 2] = True
+        for dx in range(-2, 3):
+            blocked_turn[x + dx, y - (2 - abs(dx)):y + (2 - abs(dx)) + 1] = True
+        # Obstacles exactly (2,2), (1,2) or (2,1) units away incur SAFE_COST
+        for dx, dy in ((2, 2), (1, 2), (2, 1)):
+            for sx, sy in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+                unsafe[x + sx * dx, y + sy * dy] = True
+
+    masks[PLAIN] = in_bounds & ~blocked_plain
+    masks[TURN] = in_bounds & ~blocked_turn
+    masks[ALWAYS] = True
+    masks[SAFE] = ~unsafe
+    return masks
+
+
+class PathLibrary:
+    """
+    All-pairs shortest paths over the empty arena lattice, generated offline and memory-mapped at runtime
+
+    costs[s, t] is the optimal cost from state s to state t (-1 if unreachable) and parents[s, t] is the state preceding
+    t on that path, so a path is rebuilt by walking the parent chain back from t. A library path is only used in a real
+    arena if none of its moves are blocked by obstacles and none of its cells incur SAFE_COST: its cost is then the empty
+    lattice optimum, which no path around obstacles can beat.
+    """
+    def __init__(self, costs: np.ndarray, parents: np.ndarray, arena_width: int, arena_height: int, library_dir: str = None):
+        self.costs = costs
+        self.parents = parents
+        self.arena_width = arena_width
+        self.arena_height = arena_height
+        self.library_dir = library_dir
+
+    def __reduce__(self):
+        # Worker processes memory-map the same files instead of receiving a copy of the tables
+        return (PathLibrary.load, (self.library_dir,))
+
+    @staticmethod
+    def load(library_dir: str = PATH_LIBRARY_DIR) -> Optional["PathLibrary"]:
+        """Memory-map a library generated by build(), or return None if it has not been generated
+
+        Args:
+            library_dir (str): Directory holding costs.npy and parents.npy
+        """
+        costs_path = os.path.join(library_dir, "costs.npy")
+        parents_path = os.path.join(library_dir, "parents.npy")
+        if not os.path.exists(costs_path) or not os.path.exists(parents_path):
+            return None
+
+        costs = np.load(costs_path, mmap_mode='r')
+        parents = np.load(parents_path, mmap_mode='r')
+        size = int(np.sqrt(costs.shape[0] // 4))
+        return PathLibrary(costs, parents, size, size, library_dir)
+
+    @staticmethod
+    def build(library_dir: str = PATH_LIBRARY_DIR, arena_width: int = GRID_WIDTH, arena_height: int = GRID_HEIGHT):
+        """Generate the library for an empty arena and save it to library_dir
+
+        Args:
+            library_dir (str): Directory to write costs.npy and parents.npy to
+            arena_width (int): Size of the arena in the x direction
+            arena_height (int): Size of the arena in the y direction
+        """
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import dijkstra
+
+        if arena_width != arena_height:
+            raise ValueError("The path library only supports square arenas")
+
+        library = PathLibrary(None, None, arena_width, arena_height)
+        masks = get_arena_masks([], arena_width, arena_height)
+        sources, targets, weights = [], [], []
+        for x in range(arena_width):
+            for y in range(arena_height):
+                for d in (Direction.NORTH, Direction.EAST, Direction.SOUTH, Direction.WEST):
+                    for (from_direction, to_direction, dx, dy), cells in MOVE_CHECKS.items():
+                        if from_direction != d:
+                            continue
+                        if all(masks[mode, x + cx + PADDING, y + cy + PADDING] for mode, cx, cy in cells):
+                            sources.append(library.get_state_index(x, y, d))
+                            targets.append(library.get_state_index(x + dx, y + dy, to_direction))
+                            weights.append(get_move_cost(from_direction, to_direction))
+
+        n_states = arena_width * arena_height * 4
+        graph = csr_matrix((weights, (sources, targets)), shape=(n_states, n_states))
+        distances, predecessors = dijkstra(graph, directed=True, return_predecessors=True)
+
+        costs = np.where(np.isinf(distances), -1, distances).astype(np.int32)
+        parents = np.where(predecessors < 0, -1, predecessors).astype(np.int16)
+
+        os.makedirs(library_dir, exist_ok=True)
+        np.save(os.path.join(library_dir, "costs.npy"), costs)
+        np.save(os.path.join(library_dir, "parents.npy"), parents)
+
+    def get_state_index(self, x: int, y: int, d: int) -> int:
+        """Flat index of the (x, y, d) state in the library tables"""
+        return (x * self.arena_height + y) * 4 + d // 2
+
+    def covers(self, arena_width: int, arena_height: int) -> bool:
+        """Checks if the library was generated for an arena of this size"""
+        return self.arena_width == arena_width and self.arena_height == arena_height
+
+    def get_path(self, start, end, masks: np.ndarray):
+        """Look up the library path from start to end and validate it against the arena masks in one vectorised pass
+
+        Args:
+            start (GridCell): Start cell state
+            end (GridCell): End cell state
+            masks (np.ndarray): Masks of the arena from get_arena_masks
+
+        Returns:
+            Tuple: (cost, list of (x, y, direction) states from start to end), or None if A* search is needed
+        """
+        for cell in (start, end):
+            if not (0 <= cell.x < self.arena_width and 0 <= cell.y < self.arena_height) or cell.direction == Direction.NONE:
+                return None
+
+        source = self.get_state_index(start.x, start.y, start.direction)
+        cursor = self.get_state_index(end.x, end.y, end.direction)
+        cost = int(self.costs[source, cursor])
+        if cost < 0:
+            return None
+
+        states = [cursor]
+        while cursor != source:
+            cursor = int(self.parents[source, cursor])
+            states.append(cursor)
+        states = np.array(states[::-1])
+
+        xs = states // (self.arena_height * 4)
+        ys = (states // 4) % self.arena_height
+        ds = states % 4
+        checks = CHECK_TABLE[ds[:-1], ds[1:], xs[1:] - xs[:-1] + BIGGER_CHANGE, ys[1:] - ys[:-1] + BIGGER_CHANGE]
+        if not masks[checks[..., 0], xs[:-1, None] + checks[..., 1] + PADDING, ys[:-1, None] + checks[..., 2] + PADDING].all():
+            return None
+        if not masks[SAFE, xs[1:] + PADDING, ys[1:] + PADDING].all():
+            return None
+
+        return cost, [(int(x), int(y), Direction(int(d) * 2)) for x, y, d in zip(xs, ys, ds)]
+
+
+if __name__ == '__main__':
+    PathLibrary.build()
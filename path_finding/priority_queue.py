@@ -0,0 +1,133 @@
+import heapq
+
+
+class HeapQueue:
+    """
+    Binary heap priority queue, for searches whose priorities may be any number
+    """
+    def __init__(self):
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, priority, item):
+        heapq.heappush(self.heap, (priority, item))
+
+    def pop(self):
+        """Remove and return the (priority, item) pair with the smallest priority, ties broken by the smallest item"""
+        return heapq.heappop(self.heap)
+
+
+class BucketQueue:
+    """
+    Bucket priority queue, for searches whose priorities are integers that seldom go down, such as A* with integer move
+    costs and a consistent heuristic
+
+    Items are appended to one bucket per priority. Only the bucket being popped is kept as a heap, so that items of the
+    same priority come out in the same order as from HeapQueue, and finding the next bucket only looks at the priorities
+    still queued, of which an A* search has a handful at a time.
+    """
+    def __init__(self):
+        self.buckets = dict()
+        # Priority of the bucket items are popped from, None while the queue is empty
+        self.current = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, priority, item):
+        self.size += 1
+        if priority == self.current:
+            heapq.heappush(self.buckets[priority], item)
+        elif priority in self.buckets:
+            self.buckets[priority].append(item)
+        else:
+            self.buckets[priority] = [item]
+
+        # A lower priority than the current one is allowed, the queue simply moves back to it
+        if self.current is not None and priority < self.current:
+            self.__set_current(priority)
+
+    def pop(self):
+        """Remove and return the (priority, item) pair with the smallest priority, ties broken by the smallest item"""
+        if self.current is None:
+            self.__set_current(min(self.buckets))
+
+        bucket = self.buckets[self.current]
+        priority, item = self.current, heapq.heappop(bucket)
+        self.size -= 1
+        if not bucket:
+            del self.buckets[priority]
+            self.current = None
+        return priority, item
+
+    def __set_current(self, priority):
+        self.current = priority
+        heapq.heapify(self.buckets[priority])
+
+
+def benchmark(layouts: int = 10, arena_size: int = 20, seed: int = 0):
+    """Time HeapQueue against BucketQueue on the queue operations of the A* searches between the viewing positions of
+    random layouts, replayed on their own so that the time taken to generate neighbours does not drown the difference
+
+    Args:
+        layouts (int): number of random layouts to record the searches of
+        arena_size (int): width and height of the arenas
+        seed (int): seed of the random layouts
+    """
+    import random
+    import time
+
+    from arena_objects import Arena, Obstacle, Robot
+
+    from .path_finder import PathFinder
+
+    traces = []
+
+    class RecordingQueue(HeapQueue):
+        def __init__(self):
+            super().__init__()
+            self.trace = []
+            traces.append(self.trace)
+
+        def push(self, priority, item):
+            self.trace.append((priority, item))
+            super().push(priority, item)
+
+        def pop(self):
+            self.trace.append(None)
+            return super().pop()
+
+    rng = random.Random(seed)
+    for _ in range(layouts):
+        arena = Arena(arena_width=arena_size, arena_height=arena_size, robot=Robot(1, 1, 0))
+        for obstacle_id in range(1, rng.randint(3, 8) + 1):
+            arena.add_obstacle(Obstacle(rng.randint(5, arena_size - 1), rng.randint(5, arena_size - 1), rng.choice([0, 2, 4, 6]), obstacle_id))
+        path_finder = PathFinder(arena, workers=1)
+        path_finder.queue_type = RecordingQueue
+        states = [arena.get_robot().get_robot_cell()] + [cell for cells in arena.get_viewing_positions(False) for cell in cells]
+        for i in range(len(states) - 1):
+            path_finder.search_edges(states[i], states[i + 1:])
+
+    def replay(queue_type):
+        popped = []
+        start_time = time.perf_counter()
+        for trace in traces:
+            queue = queue_type()
+            for operation in trace:
+                if operation is None:
+                    popped.append(queue.pop())
+                else:
+                    queue.push(*operation)
+        return time.perf_counter() - start_time, popped
+
+    heap_time, heap_popped = replay(HeapQueue)
+    bucket_time, bucket_popped = replay(BucketQueue)
+    print(f"{len(traces)} searches, {sum(map(len, traces))} queue operations")
+    print(f"HeapQueue: {heap_time:0.3f}s, BucketQueue: {bucket_time:0.3f}s, same order: {heap_popped == bucket_popped}")
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,117 @@
+import threading
+from typing import List
+
+from arena_objects import Arena, GridCell, Obstacle, Robot
+
+from .path_finder import PathFinder
+
+
+class RunPlan:
+    """
+    Plan of the current run, kept so that it can be repaired when obstacles turn out to be missing, misplaced or
+    unexpected partway through the run, instead of planning from scratch
+
+    The legs are searched incrementally (see path_finding/incremental.py), so an update only works out again the moves
+    near the obstacles that changed. The tour is then planned again from the robot's current state: obstacles keep the
+    viewing position they had in the plan, while the order is optimised afresh and obstacles that changed, or whose
+    viewing position is no longer reachable, choose again among all of theirs.
+    """
+    def __init__(self, arena: Arena, obstacles: List[dict], retrying: bool, optimal_path: List[GridCell]):
+        """
+        Args:
+            arena (Arena): Arena the plan was made for
+            obstacles (List[dict]): obstacles of the plan, each a dictionary with keys "x", "y", "d", and "id"
+            retrying (bool): Whether or not the robot needs to retry
+            optimal_path (List[GridCell]): path of the plan
+        """
+        self.obstacles = {ob['id']: ob for ob in obstacles}
+        self.retrying = retrying
+        self.arena = Arena(arena_width=arena.arena_width, arena_height=arena.arena_height, robot=arena.get_robot())
+        self.arena.set_obstacles(list(arena.get_obstacles()))
+        # Viewing position the plan photographs each obstacle from, and the obstacles already photographed
+        self.views = self.__get_views(optimal_path)
+        self.visited = set()
+        self.updated = False
+        # Built by prepare, in the background after /path answers, or by the first update otherwise
+        self.path_finder = None
+        self.lock = threading.Lock()
+
+    def __get_views(self, optimal_path: List[GridCell]) -> dict:
+        return {cell.screenshot_id: (cell.x, cell.y, cell.direction) for cell in optimal_path if cell.screenshot_id != -1}
+
+    def __get_view_positions(self, changed_ids: set) -> List[List[GridCell]]:
+        """Viewing positions to choose from for each obstacle left to photograph
+
+        Args:
+            changed_ids (set): ids of the obstacles added or moved since the plan was made
+
+        Returns:
+            List[List[GridCell]]: viewing positions of each obstacle, as for PathFinder.get_shortest_path
+        """
+        view_positions = []
+        for views in self.arena.get_viewing_positions(self.retrying):
+            # Obstacles with no reachable viewing position are passed on as they are, to be left out of the tour
+            obstacle_id = views[0].screenshot_id if views else None
+            if obstacle_id in self.visited:
+                continue
+
+            kept_views = [
+                view for view in views
+                if obstacle_id not in changed_ids and (view.x, view.y, view.direction) == self.views.get(obstacle_id)
+            ]
+            view_positions.append(kept_views or views)
+        return view_positions
+
+    def __get_path_finder(self) -> PathFinder:
+        if self.path_finder is None:
+            self.path_finder = PathFinder(self.arena, workers=1, incremental=True)
+        return self.path_finder
+
+    def prepare(self):
+        """Search the legs of the plan ahead of the first update, so that the update only has to repair them"""
+        with self.lock:
+            path_finder = self.__get_path_finder()
+            # Large arenas are not searched incrementally, and an update searches their legs again anyway
+            if path_finder.incremental_search is not None:
+                path_finder.get_shortest_path(self.retrying, self.__get_view_positions(set()))
+
+    def complete(self, optimal_path: List[GridCell]):
+        """Take on the whole tour once the rest of a first leg has been planned, unless an update came first
+
+        Args:
+            optimal_path (List[GridCell]): path of the whole tour
+        """
+        with self.lock:
+            if not self.updated:
+                self.views = self.__get_views(optimal_path)
+
+    def update(self, robot: Robot, obstacles: List[dict], removed_ids: List[int], visited_ids: List[int]):
+        """Repair the plan after the obstacles changed
+
+        Args:
+            robot (Robot): Robot at its current state, which the new plan starts from
+            obstacles (List[dict]): obstacles to add, or to move if their id is already in the plan, each a dictionary
+                with keys "x", "y", "d", and "id"
+            removed_ids (List[int]): ids of the obstacles to remove
+            visited_ids (List[int]): ids of the obstacles already photographed, left out of the new plan
+
+        Returns:
+            optimal_path (List):   List of paths for the robot to follow
+            total_distance (int):   Total Distance required to travel in units
+            obstacles (List[dict]): All the obstacles of the plan after the update
+        """
+        with self.lock:
+            for ob in obstacles:
+                self.obstacles[ob['id']] = ob
+            for obstacle_id in removed_ids:
+                self.obstacles.pop(obstacle_id, None)
+            self.visited.update(visited_ids)
+            self.updated = True
+
+            path_finder = self.__get_path_finder()
+            path_finder.update_arena(robot, [Obstacle(ob['x'], ob['y'], ob['d'], ob['id']) for ob in self.obstacles.values()])
+            changed_ids = {ob['id'] for ob in obstacles}
+            optimal_path, total_distance = path_finder.get_shortest_path(self.retrying, self.__get_view_positions(changed_ids))
+
+            self.views = self.__get_views(optimal_path)
+            return optimal_path, total_distance, list(self.obstacles.values())
@@ -0,0 +1,174 @@
+import json
+import sys
+from typing import Optional
+
+import numpy as np
+
+from arena_objects import GridCell
+
+
+class SearchTrace:
+    """
+    Trace of the A* searches of a plan, to find out which layouts make the searches expand many states
+
+    Pass one to PathFinder as trace and every leg searched with A* adds the states it expands, in order, with their g
+    and f values and the size of the queue when they were popped. Legs taken from the path library, an incremental
+    tree or the hierarchical search are not A* searches and are not traced.
+
+    The trace is saved as a NumPy .npz file, one row per leg in the per-leg arrays and the expansions of every leg
+    concatenated in the per-expansion arrays, leg i owning rows offsets[i] to offsets[i + 1]:
+
+        starts, ends (legs x 3):        (x, y, direction) of the start and end state of each leg
+        costs (legs):                   cost of the path found, -1 if the end was unreachable
+        offsets (legs + 1):             index of each leg's first expansion
+        x, y, d, g, f, queue (expansions):  state, cost from the start, priority and queue size of each expansion
+        obstacles (obstacles x 3), arena_size (2):  layout the plan was made for
+    """
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.costs = []
+        self.offsets = [0]
+        self.expansions = []
+
+    def start_leg(self, start: GridCell, end: GridCell):
+        """Start tracing the search from start to end"""
+        self.starts.append((start.x, start.y, int(start.direction)))
+        self.ends.append((end.x, end.y, int(end.direction)))
+        self.costs.append(-1)
+        self.offsets.append(self.offsets[-1])
+
+    def expand(self, x: int, y: int, direction: int, g, f, queue_size: int):
+        """Add a state popped off the queue to the leg being searched"""
+        self.expansions.append((x, y, direction, g, f, queue_size))
+        self.offsets[-1] += 1
+
+    def end_leg(self, cost):
+        """Set the cost of the path the leg being searched found"""
+        self.costs[-1] = cost
+
+    def save(self, file, arena):
+        """Save the trace as a .npz file
+
+        Args:
+            file: path or file object to save to
+            arena (Arena): Arena the plan was made for
+        """
+        expansions = np.array(self.expansions, dtype=np.float64).reshape(-1, 6)
+        np.savez_compressed(
+            file,
+            starts=np.array(self.starts, dtype=np.int16).reshape(-1, 3),
+            ends=np.array(self.ends, dtype=np.int16).reshape(-1, 3),
+            costs=np.array(self.costs, dtype=np.float64),
+            offsets=np.array(self.offsets, dtype=np.int64),
+            x=expansions[:, 0].astype(np.int16),
+            y=expansions[:, 1].astype(np.int16),
+            d=expansions[:, 2].astype(np.int8),
+            g=expansions[:, 3],
+            f=expansions[:, 4],
+            queue=expansions[:, 5].astype(np.int32),
+            obstacles=np.array([(ob.x, ob.y, int(ob.direction)) for ob in arena.get_obstacles()], dtype=np.int16).reshape(-1, 3),
+            arena_size=np.array([arena.arena_width, arena.arena_height], dtype=np.int16),
+        )
+
+
+def get_expansion_counts(trace, legs=None) -> np.ndarray:
+    """Count how many times each cell was expanded, over all directions
+
+    Args:
+        trace: trace loaded with np.load, or the path of its .npz file
+        legs (optional): indices of the legs to count, all legs by default
+
+    Returns:
+        np.ndarray: (width, height) expansion counts, indexed by [x, y]
+    """
+    if not hasattr(trace, 'files'):
+        trace = np.load(trace)
+    width, height = trace['arena_size']
+    x, y = trace['x'], trace['y']
+    if legs is not None:
+        offsets = trace['offsets']
+        rows = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in np.atleast_1d(legs)] + [np.zeros(0, dtype=np.int64)])
+        x, y = x[rows], y[rows]
+    return np.bincount(x.astype(np.int64) * height + y, minlength=width * height).reshape(width, height)
+
+
+def plot_expansion_heatmap(trace, legs=None, ax=None):
+    """Draw how many times each cell of the arena was expanded, with the obstacles and the faces their images are on
+
+    Args:
+        trace: trace loaded with np.load, or the path of its .npz file
+        legs (optional): indices of the legs to draw, all legs by default
+        ax (optional): matplotlib Axes to draw on, a new figure by default
+
+    Returns:
+        matplotlib Axes drawn on
+    """
+    import matplotlib.pyplot as plt
+
+    if not hasattr(trace, 'files'):
+        trace = np.load(trace)
+    counts = get_expansion_counts(trace, legs)
+    if ax is None:
+        _, ax = plt.subplots(figsize=(6, 6))
+
+    # Transposed so that x runs left to right and y bottom to top, as on the arena
+    image = ax.imshow(counts.T, origin='lower', cmap='magma')
+    ax.figure.colorbar(image, ax=ax, label='expansions')
+    # Offset of the marker of each image face from the obstacle's centre, by direction
+    faces = {0: (0, 0.4), 2: (0.4, 0), 4: (0, -0.4), 6: (-0.4, 0)}
+    for x, y, direction in trace['obstacles']:
+        ax.add_patch(plt.Rectangle((x - 0.5, y - 0.5), 1, 1, fill=False, edgecolor='cyan', linewidth=2))
+        face_x, face_y = faces.get(int(direction), (0, 0))
+        ax.plot(x + face_x, y + face_y, 'o', color='cyan', markersize=4)
+
+    legs_shown = len(trace['costs']) if legs is None else len(np.atleast_1d(legs))
+    ax.set_title(f"{int(counts.sum())} expansions over {legs_shown} legs")
+    ax.set_xlabel('x')
+    ax.set_ylabel('y')
+    return ax
+
+
+def trace_request(request: dict, retrying: Optional[bool] = None) -> tuple:
+    """Plan a /path request with every leg searched by A* and traced
+
+    Args:
+        request (dict): JSON body of a /path request
+        retrying (bool, optional): overrides the request's "retrying"
+
+    Returns:
+        tuple: (SearchTrace, Arena) of the plan
+    """
+    from arena_objects import Arena, Obstacle, Robot
+    from consts import GRID_HEIGHT, GRID_WIDTH
+
+    from .path_finder import PathFinder
+
+    robot = Robot(request['robot_x'], request['robot_y'], int(request['robot_dir']))
+    arena = Arena(
+        arena_width=int(request.get('arena_width', GRID_WIDTH)),
+        arena_height=int(request.get('arena_height', GRID_HEIGHT)),
+        robot=robot,
+    )
+    for ob in request['obstacles']:
+        arena.add_obstacle(Obstacle(ob['x'], ob['y'], ob['d'], ob['id']))
+
+    trace = SearchTrace()
+    path_finder = PathFinder(arena, workers=1, trace=trace)
+    path_finder.get_shortest_path(request['retrying'] if retrying is None else retrying)
+    return trace, arena
+
+
+if __name__ == '__main__':
+    # python -m path_finding.search_trace request.json trace.npz [heatmap.png]
+    with open(sys.argv[1]) as file:
+        request = json.load(file)
+    trace, arena = trace_request(request)
+    trace.save(sys.argv[2], arena)
+    print(f"{len(trace.costs)} legs, {len(trace.expansions)} expansions saved to {sys.argv[2]}")
+
+    if len(sys.argv) > 3:
+        import matplotlib
+        matplotlib.use('Agg')
+        ax = plot_expansion_heatmap(sys.argv[2])
+        ax.figure.savefig(sys.argv[3], bbox_inches='tight')
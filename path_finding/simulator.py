@@ -0,0 +1,283 @@
+import sys
+from typing import List, Optional
+
+import numpy as np
+
+from consts import GRID_HEIGHT, GRID_WIDTH, TURN_RADIUS
+
+# Unit vector of each heading, indexed by direction // 2 (NORTH, EAST, SOUTH, WEST)
+HEADINGS = np.array([(0, 1), (1, 0), (0, -1), (-1, 0)])
+
+BIGGER_CHANGE = max(TURN_RADIUS)
+SMALLER_CHANGE = min(TURN_RADIUS)
+
+# Turn commands as (sign along the heading, sign to the right of it, quarter turns clockwise), mirroring the moves of
+# PathFinder.__get_neighbors: a forward right turn from (x, y) facing north ends at (x + BIGGER_CHANGE, y + SMALLER_CHANGE)
+# facing east, sweeping up the heading before turning into the new one
+TURN_MOVES = {
+    "FR00": (1, 1, 1),
+    "FL00": (1, -1, -1),
+    "BR00": (-1, 1, -1),
+    "BL00": (-1, -1, 1),
+}
+
+
+def build_moves():
+    """Work out the cells every command sweeps through from each heading
+
+    Returns:
+        Tuple: (offsets, lengths, turns, command ids): offsets is a (moves, 4 headings, longest sweep, 3) array of the
+            (dx, dy, quarter turns) of each cell swept, relative to the state the command starts at and ending with the
+            state it ends at, lengths the number of cells each move sweeps, turns the quarter turns clockwise of each
+            move, and command ids maps each command to its move, commands that do not move the robot mapping to 0
+    """
+    moves = [[[] for _ in range(4)]]
+    turns = [0]
+    command_ids = dict()
+
+    for command, (forward, right, turn) in TURN_MOVES.items():
+        command_ids[command] = len(moves)
+        sweeps = []
+        for heading in range(4):
+            (hx, hy), (rx, ry) = HEADINGS[heading], HEADINGS[(heading + 1) % 4]
+            sweep = [(forward * k * hx, forward * k * hy, 0) for k in range(1, SMALLER_CHANGE + 1)]
+            base_x, base_y = forward * SMALLER_CHANGE * hx, forward * SMALLER_CHANGE * hy
+            sweep += [(base_x + right * k * rx, base_y + right * k * ry, turn) for k in range(1, BIGGER_CHANGE + 1)]
+            sweeps.append(sweep)
+        moves.append(sweeps)
+        turns.append(turn)
+
+    # Straight moves of 1 to 9 steps forward and backward
+    for sign, prefixes in ((1, ("FW", "FS")), (-1, ("BW", "BS"))):
+        for steps in range(1, 10):
+            for prefix in prefixes:
+                command_ids[f"{prefix}{steps * 10}"] = len(moves)
+            moves.append([
+                [(sign * k * HEADINGS[heading][0], sign * k * HEADINGS[heading][1], 0) for k in range(1, steps + 1)]
+                for heading in range(4)
+            ])
+            turns.append(0)
+
+    longest = max(len(sweep) for sweeps in moves for sweep in sweeps)
+    offsets = np.zeros((len(moves), 4, longest, 3), dtype=np.int64)
+    lengths = np.zeros(len(moves), dtype=np.int64)
+    for move, sweeps in enumerate(moves):
+        lengths[move] = len(sweeps[0])
+        for heading, sweep in enumerate(sweeps):
+            if sweep:
+                offsets[move, heading, :len(sweep)] = sweep
+    return offsets, lengths, np.array(turns), command_ids
+
+
+MOVE_OFFSETS, MOVE_LENGTHS, MOVE_TURNS, COMMAND_IDS = build_moves()
+
+
+# Cells of blocked border around the obstacle bitmaps, swept cells further off the arena are clamped onto it
+PADDING = 1
+
+
+def get_move_id(command: str) -> int:
+    """Move of a command in the table of moves, 0 for the commands that do not move the robot"""
+    move = COMMAND_IDS.get(command)
+    if move is None:
+        if not (command.startswith("SNAP") or command == "FIN"):
+            raise ValueError(f"Unknown command {command}")
+        return 0
+    return move
+
+
+def simulate_commands(command_lists: List[List[str]], starts) -> dict:
+    """Replay many command lists at once, expanding them into the states the robot sweeps through
+
+    Every command is looked up once in the table of moves. The heading and position before each command are then found
+    with cumulative sums over all the lists, restarted at the start of each list, and the swept cells of every command
+    are laid out in one array, so that the cost does not grow with the number of Python-level steps.
+
+    Args:
+        command_lists (List[List[str]]): commands of each plan, as generated by generate_commands
+        starts: (plans, 3) start state (x, y, direction) of each plan
+
+    Returns:
+        dict: "plan", "command", "x", "y", "d": plan, index of the command, and state of every swept cell, plan by plan;
+            "final" (plans, 3): state each plan ends in
+    """
+    starts = np.asarray(starts, dtype=np.int64).reshape(-1, 3)
+    counts = np.array([len(commands) for commands in command_lists], dtype=np.int64)
+    moves = np.fromiter((get_move_id(command) for commands in command_lists for command in commands), dtype=np.int64, count=counts.sum())
+    plans = np.repeat(np.arange(len(command_lists)), counts)
+    first_command = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    # Quarter turns and headings before each command, restarting the running sums at each plan
+    turns = MOVE_TURNS[moves]
+    turned = np.cumsum(turns) - turns
+    turned -= np.repeat(turned[first_command[counts > 0]], counts[counts > 0])
+    headings = (starts[plans, 2] // 2 + turned) % 4
+
+    # Displacement of each command, taken from the state it ends in, and the position before each command
+    ends = MOVE_OFFSETS[moves, headings, np.maximum(MOVE_LENGTHS[moves] - 1, 0)] * (MOVE_LENGTHS[moves] > 0)[:, None]
+    moved = np.cumsum(ends[:, :2], axis=0) - ends[:, :2]
+    moved -= np.repeat(moved[first_command[counts > 0]], counts[counts > 0], axis=0)
+    positions = starts[plans, :2] + moved
+
+    # Every cell swept, laid out command by command
+    lengths = MOVE_LENGTHS[moves]
+    commands = np.repeat(np.arange(len(moves)), lengths)
+    steps = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    swept = MOVE_OFFSETS[moves[commands], headings[commands], steps]
+    x = positions[commands, 0] + swept[:, 0]
+    y = positions[commands, 1] + swept[:, 1]
+    d = (headings[commands] + swept[:, 2]) % 4 * 2
+
+    final = starts.copy()
+    has_commands = counts > 0
+    last = first_command[has_commands] + counts[has_commands] - 1
+    final[has_commands, :2] = positions[last] + ends[last, :2]
+    final[has_commands, 2] = (headings[last] + turns[last]) % 4 * 2
+    return {
+        "plan": plans[commands],
+        "command": commands - np.repeat(first_command, counts)[commands],
+        "x": x,
+        "y": y,
+        "d": d,
+        "final": final,
+    }
+
+
+def get_obstacle_bitmaps(obstacle_lists: List[List], arena_width: int = GRID_WIDTH, arena_height: int = GRID_HEIGHT) -> np.ndarray:
+    """Mark the cells the robot cannot stand on in each arena
+
+    The robot takes up the 3x3 cells around its position, so it collides with an obstacle less than 2 cells away in
+    both x and y, and leaves the arena on its outermost cells, as for Arena.is_reachable. The bitmaps have a blocked
+    border of PADDING cells around the arena, for obstacles on the edge and swept cells off the arena.
+
+    Args:
+        obstacle_lists (List[List]): obstacles of each arena, as dictionaries with keys "x" and "y" or as Obstacles
+        arena_width (int): Size of the arenas in the x direction
+        arena_height (int): Size of the arenas in the y direction
+
+    Returns:
+        np.ndarray: (arenas, arena_width + 2 * PADDING, arena_height + 2 * PADDING) bitmaps, True where blocked
+    """
+    bitmaps = np.ones((len(obstacle_lists), arena_width + 2 * PADDING, arena_height + 2 * PADDING), dtype=bool)
+    bitmaps[:, PADDING + 1:PADDING + arena_width - 1, PADDING + 1:PADDING + arena_height - 1] = False
+
+    cells = [
+        (arena, ob['x'], ob['y']) if isinstance(ob, dict) else (arena, ob.x, ob.y)
+        for arena, obstacles in enumerate(obstacle_lists) for ob in obstacles
+    ]
+    if cells:
+        arenas, obstacle_x, obstacle_y = np.array(cells, dtype=np.int64).T
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                bitmaps[arenas, obstacle_x + dx + PADDING, obstacle_y + dy + PADDING] = True
+    return bitmaps
+
+
+def validate_plans(
+        command_lists: List[List[str]],
+        starts,
+        obstacle_lists: List[List],
+        expected_finals=None,
+        arena_width: int = GRID_WIDTH,
+        arena_height: int = GRID_HEIGHT
+) -> dict:
+    """Replay many plans at once and check them for collisions and for ending where they were planned to
+
+    Args:
+        command_lists (List[List[str]]): commands of each plan, as generated by generate_commands
+        starts: (plans, 3) start state (x, y, direction) of each plan
+        obstacle_lists (List[List]): obstacles of each plan's arena, as dictionaries with keys "x" and "y" or as Obstacles
+        expected_finals (optional): (plans, 3) state each plan should end in, such as the last state of its path
+        arena_width (int): Size of the arenas in the x direction
+        arena_height (int): Size of the arenas in the y direction
+
+    Returns:
+        dict: "collisions" (plans): number of swept cells where the robot hits an obstacle or leaves the arena;
+            "first_collision" (plans): index of the first command that collides, -1 if none does;
+            "final" (plans, 3): state each plan ends in;
+            "final_mismatch" (plans): whether the plan ends elsewhere than expected, all False without expected_finals
+    """
+    simulation = simulate_commands(command_lists, starts)
+    bitmaps = get_obstacle_bitmaps(obstacle_lists, arena_width, arena_height)
+
+    x = np.clip(simulation["x"] + PADDING, 0, bitmaps.shape[1] - 1)
+    y = np.clip(simulation["y"] + PADDING, 0, bitmaps.shape[2] - 1)
+    hits = bitmaps[simulation["plan"], x, y]
+
+    plans = len(command_lists)
+    collisions = np.bincount(simulation["plan"][hits], minlength=plans)
+    # Least colliding command of each plan, taken with np.minimum.at as assigning to repeated indices keeps no set one
+    first_collision = np.full(plans, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first_collision, simulation["plan"][hits], simulation["command"][hits])
+    first_collision[first_collision == np.iinfo(np.int64).max] = -1
+
+    final = simulation["final"]
+    if expected_finals is None:
+        final_mismatch = np.zeros(plans, dtype=bool)
+    else:
+        final_mismatch = np.any(final != np.asarray(expected_finals, dtype=np.int64).reshape(-1, 3), axis=1)
+    return {
+        "collisions": collisions,
+        "first_collision": first_collision,
+        "final": final,
+        "final_mismatch": final_mismatch,
+    }
+
+
+def validate_solution_store(db_path: str, limit: Optional[int] = None):
+    """Validate the commands of every solution in a SolutionStore and print the plans that fail
+
+    Args:
+        db_path (str): Path of the SQLite database of the SolutionStore
+        limit (int, optional): Largest number of solutions to validate
+    """
+    import time
+
+    from .helper import generate_commands
+    from .solution_store import SolutionStore
+
+    store = SolutionStore(db_path)
+    solutions = list(store.get_solutions(limit))
+    if not solutions:
+        print(f"No solutions in {db_path}")
+        return
+
+    start_time = time.perf_counter()
+    command_lists, starts, finals, obstacle_lists = [], [], [], []
+    for arena, _, optimal_path, _ in solutions:
+        obstacles = [{'x': ob.x, 'y': ob.y, 'd': ob.direction, 'id': ob.obstacle_id} for ob in arena.get_obstacles()]
+        command_lists.append(generate_commands(optimal_path, obstacles)[0])
+        starts.append((optimal_path[0].x, optimal_path[0].y, int(optimal_path[0].direction)))
+        finals.append((optimal_path[-1].x, optimal_path[-1].y, int(optimal_path[-1].direction)))
+        obstacle_lists.append(obstacles)
+    generate_time = time.perf_counter() - start_time
+
+    # Arenas of other sizes are validated in their own batch
+    sizes = sorted({(arena.arena_width, arena.arena_height) for arena, _, _, _ in solutions})
+    failures = 0
+    start_time = time.perf_counter()
+    for width, height in sizes:
+        batch = [i for i, (arena, _, _, _) in enumerate(solutions) if (arena.arena_width, arena.arena_height) == (width, height)]
+        result = validate_plans(
+            [command_lists[i] for i in batch], [starts[i] for i in batch], [obstacle_lists[i] for i in batch],
+            [finals[i] for i in batch], width, height
+        )
+        for k, i in enumerate(batch):
+            if result["collisions"][k] or result["final_mismatch"][k]:
+                failures += 1
+                print(
+                    f"solution {i}: {result['collisions'][k]} colliding cells from command {result['first_collision'][k]}, "
+                    f"ends at {tuple(result['final'][k])} instead of {finals[i]}"
+                )
+    validate_time = time.perf_counter() - start_time
+    print(f"{len(solutions)} solutions, {failures} failing, commands generated in {generate_time:0.3f}s, validated in {validate_time:0.3f}s")
+
+
+if __name__ == '__main__':
+    # python -m path_finding.simulator [solutions.db] [limit]
+    from consts import SOLUTION_STORE_PATH
+
+    validate_solution_store(
+        sys.argv[1] if len(sys.argv) > 1 else SOLUTION_STORE_PATH,
+        int(sys.argv[2]) if len(sys.argv) > 2 else None,
+    )
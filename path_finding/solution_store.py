@@ -0,0 +1,170 @@
+import json
+import sqlite3
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+from arena_objects import Arena, GridCell, Obstacle, Robot
+from direction import Direction
+
+# Every rotation/reflection of a square arena, expressed as (number of 90 degree clockwise rotations, reflect first)
+SYMMETRIES = [(rotations, reflect) for reflect in (False, True) for rotations in range(4)]
+
+
+def transform_state(x: int, y: int, d: int, size: int, rotations: int, reflect: bool):
+    """Map a cell state through a rotation/reflection of a square arena
+
+    Args:
+        x (int): x-coordinate
+        y (int): y-coordinate
+        d (int): direction of the state
+        size (int): width (and height) of the arena
+        rotations (int): number of 90 degree clockwise rotations, applied after the reflection
+        reflect (bool): whether to mirror the arena across its vertical axis first
+
+    Returns:
+        Tuple: transformed (x, y, d)
+    """
+    if reflect:
+        x = size - 1 - x
+        d = d if d == Direction.NONE else (8 - d) % 8
+    for _ in range(rotations):
+        x, y = y, size - 1 - x
+        d = d if d == Direction.NONE else (d + 2) % 8
+    return x, y, d
+
+
+def inverse_transform_state(x: int, y: int, d: int, size: int, rotations: int, reflect: bool):
+    """Undo transform_state for the same rotations/reflect pair
+
+    Returns:
+        Tuple: original (x, y, d)
+    """
+    for _ in range(rotations):
+        x, y = size - 1 - y, x
+        d = d if d == Direction.NONE else (d + 6) % 8
+    if reflect:
+        x = size - 1 - x
+        d = d if d == Direction.NONE else (8 - d) % 8
+    return x, y, d
+
+
+class SolutionStore:
+    """
+    On-disk cache of solved layouts, backed by SQLite
+
+    Layouts are keyed by a canonical form of (obstacles, robot start, retrying): obstacle ids are dropped in favour of
+    their rank in the sorted obstacle list, and on square arenas the layout is folded over all 8 rotations/reflections,
+    keeping the smallest. Stored paths are kept in the canonical frame and mapped back through the transform on lookup.
+    """
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path (str): Path of the SQLite database file, created if it does not exist
+        """
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS solutions (layout TEXT PRIMARY KEY, path TEXT NOT NULL, distance REAL NOT NULL)"
+        )
+        self.connection.commit()
+
+    def __canonicalise(self, arena: Arena, retrying):
+        """Find the canonical form of the arena layout
+
+        Returns:
+            Tuple: (canonical key, (rotations, reflect) taking the arena to the canonical frame, obstacle ids ordered as in the key)
+        """
+        size = arena.arena_width
+        robot_cell = arena.get_robot().get_robot_cell()
+        symmetries = SYMMETRIES if arena.arena_width == arena.arena_height else SYMMETRIES[:1]
+
+        best = None
+        for rotations, reflect in symmetries:
+            obstacles = sorted(
+                (transform_state(ob.x, ob.y, int(ob.direction), size, rotations, reflect), ob.obstacle_id)
+                for ob in arena.get_obstacles()
+            )
+            robot_state = transform_state(robot_cell.x, robot_cell.y, int(robot_cell.direction), size, rotations, reflect)
+            key = json.dumps([arena.arena_width, arena.arena_height, [list(state) for state, _ in obstacles], list(robot_state), bool(retrying)])
+            if best is None or key < best[0]:
+                best = (key, (rotations, reflect), [obstacle_id for _, obstacle_id in obstacles])
+
+        return best
+
+    def lookup(self, arena: Arena, retrying) -> Optional[Tuple[List[GridCell], float]]:
+        """Fetch a stored solution for the arena layout, mapped back into the arena's frame
+
+        Args:
+            arena (Arena): Arena to look up
+            retrying (boolean): Whether or not the robot needs to retry
+
+        Returns:
+            Tuple: (optimal_path, total_distance) as returned by PathFinder.get_shortest_path, or None on a miss
+        """
+        key, (rotations, reflect), obstacle_ids = self.__canonicalise(arena, retrying)
+        with self.lock:
+            row = self.connection.execute("SELECT path, distance FROM solutions WHERE layout = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        optimal_path = []
+        for x, y, d, obstacle_rank in json.loads(row[0]):
+            x, y, d = inverse_transform_state(x, y, d, arena.arena_width, rotations, reflect)
+            screenshot_id = -1 if obstacle_rank == -1 else obstacle_ids[obstacle_rank]
+            optimal_path.append(GridCell(x, y, Direction(d), screenshot_id))
+
+        return optimal_path, row[1]
+
+    def get_solutions(self, limit: Optional[int] = None) -> Iterator[Tuple[Arena, bool, List[GridCell], float]]:
+        """Read back the stored solutions in their canonical frame, such as to validate them all after a planner change
+
+        Args:
+            limit (int, optional): Largest number of solutions to read, all of them by default
+
+        Yields:
+            Tuple: (arena, retrying, optimal_path, total_distance) of each solution, obstacle ids numbered from 1 in the
+                order of the canonical layout
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT layout, path, distance FROM solutions LIMIT ?", (-1 if limit is None else limit,)).fetchall()
+
+        for layout, path, distance in rows:
+            arena_width, arena_height, obstacles, (robot_x, robot_y, robot_d), retrying = json.loads(layout)
+            arena = Arena(arena_width=arena_width, arena_height=arena_height, robot=Robot(robot_x, robot_y, Direction(robot_d)))
+            for rank, (x, y, d) in enumerate(obstacles):
+                arena.add_obstacle(Obstacle(x, y, Direction(d), rank + 1))
+            optimal_path = [
+                GridCell(x, y, Direction(d), -1 if obstacle_rank == -1 else obstacle_rank + 1)
+                for x, y, d, obstacle_rank in json.loads(path)
+            ]
+            yield arena, retrying, optimal_path, distance
+
+    def save(self, arena: Arena, retrying, optimal_path: List[GridCell], total_distance: float):
+        """Store a solution for the arena layout in the canonical frame, unless a shorter one is already stored
+
+        Args:
+            arena (Arena): Arena that was solved
+            retrying (boolean): Whether or not the robot needs to retry
+            optimal_path (List[GridCell]): Path returned by PathFinder.get_shortest_path
+            total_distance (float): Distance returned by PathFinder.get_shortest_path
+        """
+        # Nothing worth caching if the planner could not find a path
+        if not optimal_path:
+            return
+
+        key, (rotations, reflect), obstacle_ids = self.__canonicalise(arena, retrying)
+        path = []
+        for cell in optimal_path:
+            x, y, d = transform_state(cell.x, cell.y, int(cell.direction), arena.arena_width, rotations, reflect)
+            obstacle_rank = -1 if cell.screenshot_id == -1 else obstacle_ids.index(cell.screenshot_id)
+            path.append([x, y, d, obstacle_rank])
+
+        with self.lock:
+            # The planner is not exactly symmetric (tie-breaking, ITERATIONS truncation), so keep the shorter plan per layout
+            self.connection.execute(
+                "INSERT INTO solutions (layout, path, distance) VALUES (?, ?, ?) "
+                "ON CONFLICT(layout) DO UPDATE SET path = excluded.path, distance = excluded.distance "
+                "WHERE excluded.distance < solutions.distance",
+                (key, json.dumps(path), float(total_distance)),
+            )
+            self.connection.commit()
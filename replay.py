@@ -0,0 +1,176 @@
+"""
+Replay of the traffic captured by flask_routes/capture.py, to load-test the server against real runs
+
+    python replay.py <capture folder> [--url http://localhost:5001] [--concurrency 4] [--repeat 1] [--routes /path ...]
+
+Without --url, requests are sent to the Flask app in this process through its test client, which leaves the network
+out of the latencies. TRAFFIC_CAPTURE_DIR should then be unset, so that the replay is not captured in turn.
+
+The captured requests are sent in order by --concurrency threads, each taking the next request as soon as its previous
+one is answered, and a table of latency percentiles, throughput and error rate per route is printed at the end.
+Requests answering 400 or above, or failing to get an answer at all, are errors.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+
+def load_capture(folder: str, routes=None) -> list:
+    """
+    Reads the captured requests of a capture folder, with the uploaded files read back from their blobs
+
+    :param folder: capture-<time> folder written by TrafficCapture
+    :param routes: routes to keep, all of them by default
+    :return: the captured entries, in the order they were captured
+    """
+    entries = []
+    with open(os.path.join(folder, 'traffic.jsonl')) as file:
+        for line in file:
+            entry = json.loads(line)
+            if routes and entry['route'] not in routes:
+                continue
+            if entry['file'] is not None:
+                with open(os.path.join(folder, entry['file']['blob']), 'rb') as blob:
+                    entry['file']['data'] = blob.read()
+            entries.append(entry)
+    return sorted(entries, key=lambda entry: entry['seq'])
+
+def get_test_client_sender():
+    """
+    Returns a function sending an entry to the Flask app of this process, with one test client per thread
+    """
+    import io
+
+    from server import app
+
+    local = threading.local()
+
+    def send(entry):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        data = dict(entry['form'])
+        if entry['file'] is not None:
+            data[entry['file']['field']] = (io.BytesIO(entry['file']['data']), entry['file']['filename'])
+        response = local.client.open(
+            entry['route'], method=entry['method'], query_string=entry['args'],
+            json=entry['json'], data=data if entry['json'] is None else None,
+        )
+        return response.status_code
+
+    return send
+
+def get_http_sender(url: str):
+    """
+    Returns a function sending an entry to the server at url, with one HTTP session per thread
+    """
+    import requests
+
+    local = threading.local()
+
+    def send(entry):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        files = None
+        if entry['file'] is not None:
+            files = {entry['file']['field']: (entry['file']['filename'], entry['file']['data'])}
+        response = local.session.request(
+            entry['method'], url.rstrip('/') + entry['route'], params=entry['args'],
+            json=entry['json'], data=entry['form'] or None, files=files,
+        )
+        return response.status_code
+
+    return send
+
+def replay(entries: list, send, concurrency: int = 1, repeat: int = 1) -> dict:
+    """
+    Sends the entries with the given number of threads and times each request
+
+    :param entries: captured entries, as returned by load_capture
+    :param send: function sending one entry and returning the status code
+    :param concurrency: number of requests in flight at a time
+    :param repeat: number of times to send the whole capture
+    :return: a dictionary with keys "results", a list of (route, latency in seconds, status code, 0 if no answer), and
+             "elapsed", the seconds the replay took
+    """
+    work = iter([entry for _ in range(repeat) for entry in entries])
+    work_lock = threading.Lock()
+    results = []
+
+    def worker():
+        while True:
+            with work_lock:
+                entry = next(work, None)
+            if entry is None:
+                return
+            started = time.perf_counter()
+            try:
+                status_code = send(entry)
+            except Exception as error:
+                print(f"{entry['route']} #{entry['seq']} failed: {error}")
+                status_code = 0
+            # list.append is atomic, the workers need no lock to record their results
+            results.append((entry['route'], time.perf_counter() - started, status_code))
+
+    start_time = time.perf_counter()
+    threads = [threading.Thread(target=worker, name=f"replay-{i}") for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"results": results, "elapsed": time.perf_counter() - start_time}
+
+def summarise(replayed: dict) -> dict:
+    """
+    Latency percentiles, throughput and error rate of each route of a replay, and of all of them as "all"
+
+    :param replayed: result of replay
+    :return: a dictionary of route to a dictionary with keys "requests", "p50", "p95", "p99" (milliseconds),
+             "throughput" (requests per second over the whole replay) and "error_rate"
+    """
+    by_route = defaultdict(list)
+    for route, latency, status_code in replayed['results']:
+        by_route[route].append((latency, status_code))
+        by_route['all'].append((latency, status_code))
+
+    summary = dict()
+    for route, results in by_route.items():
+        latencies = np.array([latency for latency, _ in results]) * 1000
+        errors = sum(1 for _, status_code in results if status_code == 0 or status_code >= 400)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary[route] = {
+            'requests': len(results),
+            'p50': p50,
+            'p95': p95,
+            'p99': p99,
+            'throughput': len(results) / replayed['elapsed'],
+            'error_rate': errors / len(results),
+        }
+    return summary
+
+def print_summary(summary: dict):
+    print(f"{'route':<12}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>10}")
+    for route, stats in sorted(summary.items(), key=lambda item: item[0] == 'all'):
+        print(
+            f"{route:<12}{stats['requests']:>10}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}"
+            f"{stats['throughput']:>10.2f}{stats['error_rate']:>10.1%}"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay captured /path and /image traffic against the server")
+    parser.add_argument('capture', help="capture-<time> folder written with TRAFFIC_CAPTURE_DIR set")
+    parser.add_argument('--url', help="server to send the requests to, the app of this process if not given")
+    parser.add_argument('--concurrency', type=int, default=1, help="requests in flight at a time")
+    parser.add_argument('--repeat', type=int, default=1, help="times to send the whole capture")
+    parser.add_argument('--routes', nargs='*', help="routes to replay, all of them if not given")
+    arguments = parser.parse_args()
+
+    entries = load_capture(arguments.capture, arguments.routes)
+    send = get_http_sender(arguments.url) if arguments.url else get_test_client_sender()
+    print(f"Replaying {len(entries)} requests x{arguments.repeat} with {arguments.concurrency} in flight")
+    print_summary(summarise(replay(entries, send, arguments.concurrency, arguments.repeat)))
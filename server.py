@@ -1,7 +1,10 @@
+import os
+
 from flask import Flask
 from flask_cors import CORS
 
-from flask_routes import status, image, path, stitch
+from consts import IMAGE_STREAM_PORT
+from flask_routes import status, image, path, stitch, start_image_stream
 
 # Initialisation
 app = Flask(__name__)
@@ -14,4 +17,7 @@ app.register_blueprint(image, url_prefix="/")
 app.register_blueprint(stitch, url_prefix="/")
 
 if __name__ == '__main__':
+    # With the debug reloader, only the child process that serves the app should listen for the frame stream
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_image_stream('0.0.0.0', IMAGE_STREAM_PORT)
     app.run(host='0.0.0.0', port=5001, debug=True)